@@ -0,0 +1,286 @@
+"""
+Batch analysis of many accounts.
+
+Fetching is network-bound and runs on a thread pool; processing the raw
+pages (process_tweets, the term index and rollups), the summary and the
+charts are CPU-bound and run in a process pool, so a nightly batch keeps
+every core busy while pages are still downloading. Bounded queues between
+the stages keep a slow stage from piling up work (and memory), and a
+failing account is reported without stopping the others.
+
+Usage:
+    python analytics.py --batch user1 user2 ...
+"""
+import io
+import os
+import queue
+import threading
+import time
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import memory
+
+BATCH_FETCH_WORKERS = int(os.environ.get("BATCH_FETCH_WORKERS", 4))
+BATCH_RENDER_WORKERS = int(os.environ.get("BATCH_RENDER_WORKERS",
+                                          1 if memory.LOW_MEMORY else os.cpu_count() or 1))
+# Accounts fetched but not yet rendering; fetchers wait when it is full
+BATCH_QUEUE_SIZE = int(os.environ.get("BATCH_QUEUE_SIZE", 8))
+
+_DONE = object()
+
+
+def fetch_account(username, incremental=True, refresh=False):
+    """
+    Stage 1, in a thread: scrape the raw pages. Returns analytics.fetch_pages'
+    (pages, now, merge) for ingest_account. An account's pages are held
+    until a worker takes them, which the bounded queue caps.
+    """
+    import analytics
+
+    with memory.job(f"@{username}"):
+        fetched = analytics.fetch_pages(username, incremental=incremental, refresh=refresh)
+    pages, _, merge = fetched
+    if not pages and not merge:
+        raise ValueError(f"No data found for @{username}")
+    return fetched
+
+
+def ingest_account(username, fetched):
+    """process_tweets the fetched pages and save them. Returns the tweet count."""
+    import analytics
+
+    tweets = analytics.ingest_pages(username, *fetched)
+    if not tweets:
+        raise ValueError(f"No data found for @{username}")
+    return tweets
+
+
+def process_account(username, fetched):
+    """
+    Stage 2, in a worker process: ingest_account, then render_account.
+    Returns (tweet count, summary text).
+    """
+    out = io.StringIO()
+    with redirect_stdout(out):
+        tweets = ingest_account(username, fetched)
+    return tweets, out.getvalue() + render_account(username)
+
+
+def render_account(username):
+    """
+    Stage 2, in a worker process: print_summary and the charts, from the
+    saved data. Returns the summary text so the parent can print whole
+    reports without interleaving.
+    """
+    import analytics
+    from terms import get_terms
+    from rollups import get_rollups
+
+    storage = analytics.user_storage
+    out = io.StringIO()
+    with redirect_stdout(out):
+        df = storage.load(username)
+        terms = get_terms(storage, username)
+        rollups = get_rollups(storage, username)
+        analytics.print_summary(df, username, terms=terms, rollups=rollups)
+        analytics.plot_engagement_heatmap(df, username, pivot=rollups.cube())
+        analytics.plot_engagement_timeline(df, username, series=rollups.series("W"))
+        analytics.plot_wordcloud(df, username, frequencies=terms.frequencies(
+            "words", analytics.WORDCLOUD_MAX_WORDS))
+    return out.getvalue()
+
+
+class _Renderer:
+    """
+    Process pool that is replaced when a worker dies. A dead worker takes
+    every render in flight with it, so those accounts are re-run at the end
+    one at a time in a fresh process each: only the one that crashes fails.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        # spawn, not fork: the parent has fetch threads holding locks
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context)
+
+    def submit(self, fn, *args):
+        """(future, pool it went to); a broken or shut down pool is replaced first."""
+        pool = self.current()
+        try:
+            return pool.submit(fn, *args), pool
+        except (BrokenProcessPool, RuntimeError):
+            self.replace(pool)
+            pool = self.current()
+            return pool.submit(fn, *args), pool
+
+    def replace(self, broken):
+        """Swap in a fresh pool, unless another thread already replaced `broken`."""
+        with self._lock:
+            if self._pool is not broken:
+                return
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def run_alone(self, fn, *args):
+        with ProcessPoolExecutor(max_workers=1, mp_context=self._context) as pool:
+            return pool.submit(fn, *args).result()
+
+    def current(self):
+        with self._lock:
+            return self._pool
+
+    def shutdown(self):
+        self.current().shutdown(wait=True)
+
+
+def run_batch(usernames, fetch_workers=BATCH_FETCH_WORKERS, render_workers=BATCH_RENDER_WORKERS,
+              queue_size=BATCH_QUEUE_SIZE, incremental=True, refresh=False, render=True):
+    """
+    Analyse `usernames` with fetching and rendering overlapped. Returns a
+    report: per-account results and errors, wall time and accounts/minute.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    fetch_workers = max(1, min(fetch_workers, len(usernames) or 1))
+    results, errors = {}, {}
+    lock = threading.Lock()
+    todo = queue.Queue()
+    for username in usernames:
+        todo.put(username)
+    fetched = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()  # set on the way out, so no fetcher waits on a dead consumer
+
+    def hand_over(item):
+        """Queue `item` for the render stage; False if the batch stopped first."""
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=0.1)  # waits while the render stage is behind
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetcher():
+        while not stop.is_set():
+            try:
+                username = todo.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                data = fetch_account(username, incremental, refresh)
+                # Without a render pool the pages are processed right here
+                tweets = ingest_account(username, data) if not render else None
+            except Exception as e:
+                traceback.print_exc()
+                with lock:
+                    errors[username] = f"fetch: {e!r}"
+                continue
+            with lock:
+                results[username] = {"tweets": tweets, "fetch_s": time.perf_counter() - start}
+            if render and not hand_over((username, data)):
+                return
+
+    def close_when_fetched(futures):
+        for future in futures:
+            future.exception()
+        hand_over(_DONE)
+
+    started = time.perf_counter()
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="batch-fetch")
+    fetchers = [fetch_pool.submit(fetcher) for _ in range(fetch_workers)]
+    threading.Thread(target=close_when_fetched, args=(fetchers,), daemon=True).start()
+
+    renderer = _Renderer(render_workers) if render else None
+    # Renders submitted but not finished: at most one waiting per worker
+    slots = renderer.workers * 2 if renderer else 1
+    limit = threading.BoundedSemaphore(slots)
+
+    suspects = []  # (username, pages) lost to a crashed worker
+
+    def submit(username, data):
+        start = time.perf_counter()
+        future, pool = renderer.submit(process_account, username, data)
+        future.add_done_callback(lambda f: finish(f, username, data, start, pool))
+
+    def finish(future, username, data, start, pool):
+        try:
+            done(username, future.result(), start)
+        except (BrokenProcessPool, CancelledError):
+            renderer.replace(pool)
+            with lock:
+                suspects.append((username, data))
+        except Exception as e:
+            with lock:
+                errors[username] = f"render: {e!r}"
+        finally:
+            limit.release()
+
+    def done(username, result, start):
+        tweets, text = result
+        print(text, end="")
+        with lock:
+            results[username].update(tweets=tweets, render_s=time.perf_counter() - start)
+
+    try:
+        while True:
+            item = fetched.get()
+            if item is _DONE:  # every fetcher has finished
+                break
+            username, data = item
+            limit.acquire()
+            try:
+                submit(username, data)
+            except Exception as e:
+                limit.release()  # finish() never runs for a render that wasn't submitted
+                traceback.print_exc()
+                with lock:
+                    errors[username] = f"render: {e!r}"
+        for _ in range(slots):  # every slot back means every render finished
+            limit.acquire()
+        for username, data in suspects:
+            start = time.perf_counter()
+            try:
+                # Re-ingesting is safe: a rewrite or a merge of the same pages
+                done(username, renderer.run_alone(process_account, username, data), start)
+            except BrokenProcessPool:
+                errors[username] = "render: worker process died"
+            except Exception as e:
+                errors[username] = f"render: {e!r}"
+    finally:
+        stop.set()
+        fetch_pool.shutdown(wait=True)
+        if renderer is not None:
+            renderer.shutdown()
+
+    elapsed = time.perf_counter() - started
+    for username in errors:
+        results.pop(username, None)
+    return {
+        "accounts": len(usernames),
+        "succeeded": sorted(results),
+        "failed": errors,
+        "results": results,
+        "elapsed_s": elapsed,
+        "accounts_per_minute": len(results) / elapsed * 60 if elapsed else 0.0,
+    }
+
+
+def print_report(report):
+    results = report["results"]
+    print(f"\nBatch: {len(report['succeeded'])}/{report['accounts']} accounts in "
+          f"{report['elapsed_s']:.1f}s ({report['accounts_per_minute']:.1f} accounts/minute)")
+    if results:
+        fetch = sum(r["fetch_s"] for r in results.values())
+        render = sum(r.get("render_s", 0) for r in results.values())
+        print(f"Stage time: fetch {fetch:.1f}s, render {render:.1f}s "
+              f"({(fetch + render) / report['elapsed_s']:.1f}x the wall time)")
+    for username, error in sorted(report["failed"].items()):
+        print(f"  @{username} failed: {error}")
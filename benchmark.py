@@ -0,0 +1,865 @@
+"""
+Performance benchmarks for X-Stats.
+
+Usage:
+    python benchmark.py fetch <url> [--pages N]
+    python benchmark.py parse <saved_timeline.html> [--repeat N]
+    python benchmark.py extract <url> [--repeat N]
+    python benchmark.py process [--sizes 1000 10000 100000]
+    python benchmark.py memory [--sizes 10000 100000 500000]
+    python benchmark.py storage [--rows 100000] [--repeat 5]
+    python benchmark.py compare [--accounts 10 100 1000] [--rows 200]
+    python benchmark.py instances [--pages 30] [--rate 3]
+    python benchmark.py batch [--accounts 12] [--pages 5] [--latency 0.2]
+    python benchmark.py suite [--sizes 1000 100000 1000000] [--output FILE] [--compare FILE]
+    python benchmark.py importtime [--modules analytics web_dashboard] [--history FILE]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import storage
+
+# `suite --compare FILE` fails on a benchmark this many times slower, by at least BENCH_MIN_MS
+BENCH_THRESHOLD = float(os.environ.get("BENCH_THRESHOLD", 1.5))
+BENCH_MIN_MS = float(os.environ.get("BENCH_MIN_MS", 1.0))
+
+WORDS = ("data launch team update today python thread great week news "
+         "release build ship open source growth product design").split()
+MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+
+
+def _report(label, pages, elapsed):
+    per_page = elapsed / pages * 1000 if pages else 0.0
+    rate = pages / elapsed if elapsed else 0.0
+    print(f"{label:<10} {pages} pages in {elapsed:.2f}s  "
+          f"{rate:.2f} pages/sec  {per_page:.1f} ms/page")
+    return {"pages": pages, "seconds": elapsed, "pages_per_sec": rate, "ms_per_page": per_page}
+
+
+def bench_fetch(url, pages=5):
+    """Fetch the same timeline with each backend and compare throughput."""
+    results = {}
+    for label, fetch in (("http", analytics.fetch_with_requests),
+                         ("selenium", analytics.fetch_with_selenium)):
+        fetch(url)  # warm up: connection pool / browser start
+        start = time.perf_counter()
+        for _ in range(pages):
+            fetch(url)
+        results[label] = _report(label, pages, time.perf_counter() - start)
+    return results
+
+
+def bench_parse(path, repeat=50):
+    """Time the bs4 parser alone against a saved timeline page."""
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    items = analytics.parse_timeline_html(html)[0] or []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        analytics.parse_timeline_html(html)
+    result = _report(f"parse ({analytics.HTML_PARSER})", repeat, time.perf_counter() - start)
+    print(f"{len(items)} tweets per page")
+    return result
+
+
+def bench_extraction(url, repeat=10):
+    """Load one page in a pooled driver and time both Selenium extraction modes on it."""
+    from selenium.webdriver.common.by import By
+    from driver_pool import get_driver_pool
+
+    results = {}
+    with get_driver_pool().driver() as driver:
+        driver.get(url)
+        items = driver.find_elements(By.CSS_SELECTOR, ".timeline-item")
+        print(f"{len(items)} timeline items on page")
+        for label, extract in (("elements", lambda: analytics.extract_with_elements(driver, items)),
+                               ("script", lambda: analytics.extract_with_script(driver))):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                extract()
+            results[label] = _report(label, repeat, time.perf_counter() - start)
+    return results
+
+
+def make_raw_frame(n, seed=0, with_ids=False):
+    """
+    Synthetic scraped tweets, in the string form fetch_timeline returns:
+    realistic hashtags, mentions, links, comma-grouped counts and a mix of
+    relative ("5h", "12m") and absolute dates. Built vectorized, so 1M rows
+    take seconds.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS)
+
+    # A pool of sentences sampled per row keeps generation vectorized
+    pool_rng = random.Random(seed)
+    pool = pd.Series([" ".join(pool_rng.choices(WORDS, k=pool_rng.randint(3, 25)))
+                      for _ in range(4096)])
+    text = pool.iloc[rng.integers(0, len(pool), n)].reset_index(drop=True)
+
+    def maybe(prob, values):
+        return pd.Series(np.where(rng.random(n) < prob, values, ""))
+
+    mentions = maybe(0.25, "@user" + rng.integers(1, 500, n).astype(str) + " ")
+    hashtags = maybe(0.3, " #" + words[rng.integers(0, len(words), n)])
+    links = maybe(0.2, " https://example.com/" + rng.integers(1, 10**6, n).astype(str))
+    tweets = mentions + text + hashtags + links
+
+    roll = rng.random(n)
+    minutes = rng.integers(1, 60, n).astype(str) + "m"
+    hours = rng.integers(1, 24, n).astype(str) + "h"
+    absolute = (np.array(MONTHS)[rng.integers(0, 12, n)] + " "
+                + rng.integers(1, 29, n).astype(str) + ", "
+                + rng.integers(2019, 2026, n).astype(str))
+    dates = np.where(roll < 0.2, minutes, np.where(roll < 0.5, hours, absolute))
+
+    def counts(high):
+        return pd.Series(rng.integers(0, high, n)).map("{:,}".format)
+
+    frame = pd.DataFrame({
+        "Date": dates,
+        "Tweet": tweets,
+        "Replies": rng.integers(0, 300, n).astype(str),
+        "Retweets": counts(2000),
+        "Likes": counts(50000),
+        "HasMedia": rng.random(n) < 0.35,
+    })
+    if with_ids:
+        frame.insert(0, "TweetId", (10**18 - np.arange(n)).astype(str))
+    return frame
+
+
+def make_raw_tweets(n, seed=0, with_ids=False):
+    """make_raw_frame as a list of records, like one fetched page."""
+    return make_raw_frame(n, seed, with_ids).to_dict("records")
+
+
+def make_tweet_frame(n, seed=0):
+    """Synthetic tweets after process_tweets, as stored per user."""
+    return analytics.process_tweets(make_raw_frame(n, seed, with_ids=True))
+
+
+def make_timeline_html(records, cursor=None, username="bench"):
+    """A Nitter timeline page holding `records`, in the markup parse_timeline_html reads."""
+    from html import escape
+
+    items = []
+    for i, tweet in enumerate(records):
+        tweet_id = tweet.get("TweetId") or str(10**18 - i)
+        media = '<div class="attachments"><img src="/pic/x.jpg"></div>' if tweet["HasMedia"] else ""
+        items.append(
+            f'<div class="timeline-item">'
+            f'<a class="tweet-link" href="/{username}/status/{tweet_id}#m"></a>'
+            f'<div class="tweet-body"><div class="tweet-header">'
+            f'<a class="fullname" href="/{username}">Bench</a>'
+            f'<span class="tweet-date"><a href="/{username}/status/{tweet_id}#m">'
+            f'{escape(tweet["Date"])}</a></span></div>'
+            f'<div class="tweet-content media-body" dir="auto">{escape(tweet["Tweet"])}</div>'
+            f'{media}<div class="tweet-stats">'
+            f'<span class="tweet-stat"><div class="icon-container"><span class="icon-comment"></span> {tweet["Replies"]}</div></span>'
+            f'<span class="tweet-stat"><div class="icon-container"><span class="icon-retweet"></span> {tweet["Retweets"]}</div></span>'
+            f'<span class="tweet-stat"><div class="icon-container"><span class="icon-heart"></span> {tweet["Likes"]}</div></span>'
+            f'</div></div></div>'
+        )
+    more = (f'<div class="show-more"><a href="?cursor={cursor}">Load more</a></div>'
+            if cursor else "")
+    body = "".join(items) or '<div class="timeline-none">No items found</div>'
+    return (f'<!DOCTYPE html><html><head><title>@{username} | nitter</title></head><body>'
+            f'<div class="timeline">{body}{more}</div></body></html>')
+
+
+class TimelineServer:
+    """
+    Local stand-in for a Nitter instance, serving synthetic timeline pages
+    for any username. Page N links to page N+1 through "?cursor=N+1" until
+    `pages` is reached. `latency` (seconds) and `error_rate` (share of
+    requests answered with a 503) simulate a slow or flaky instance.
+
+        with TimelineServer(pages=5) as server:
+            analytics.fetch_timeline(server.url + "/someone", backend="http")
+    """
+
+    def __init__(self, pages=5, page_size=20, latency=0.0, error_rate=0.0, seed=0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        records = make_raw_tweets(pages * page_size, seed=seed, with_ids=True)
+        self.pages = [
+            make_timeline_html(records[i * page_size:(i + 1) * page_size],
+                               cursor=i + 1 if i + 1 < pages else None).encode()
+            for i in range(pages)
+        ]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._rng.random() < server.error_rate:
+                    server.errors += 1
+                    self.send_error(503)
+                    return
+                match = re.search(r"[?&]cursor=(\d+)", self.path)
+                page = int(match.group(1)) if match else 0
+                body = server.pages[page] if page < len(server.pages) else make_timeline_html([]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        import threading
+
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def reference_process_tweets(df, now):
+    """The original row-wise process_tweets, kept as the regression baseline."""
+    def parse_date(date_str):
+        if 'h' in date_str:
+            return now - pd.Timedelta(hours=int(date_str.replace('h','')))
+        if 'm' in date_str:
+            return now - pd.Timedelta(minutes=int(date_str.replace('m','')))
+        try:
+            return pd.to_datetime(date_str)
+        except:
+            return pd.NaT
+
+    df["Datetime"] = df["Date"].apply(parse_date)
+    df["DayOfWeek"] = df["Datetime"].dt.day_name()
+    df["Hour"] = df["Datetime"].dt.hour
+    for col in ["Replies", "Retweets", "Likes"]:
+        df[col] = (
+            pd.to_numeric(df[col].str.replace(',', ''), errors='coerce')
+              .fillna(0)
+              .astype(int)
+        )
+    df["Engagement"] = df["Replies"] + df["Retweets"] + df["Likes"]
+    df["Hashtags"]  = df["Tweet"].apply(lambda t: re.findall(r"#\w+", t))
+    df["Mentions"]  = df["Tweet"].apply(lambda t: re.findall(r"@\w+", t))
+    df["Links"]     = df["Tweet"].apply(lambda t: re.findall(r"https?://\S+", t))
+    df["WordCount"] = df["Tweet"].apply(lambda t: len(t.split()))
+    df["HasHashtags"] = df["Hashtags"].apply(bool)
+    df["HasMentions"] = df["Mentions"].apply(bool)
+    df["HasLinks"]    = df["Links"].apply(bool)
+    df["HasMedia"]    = df["HasMedia"].astype(bool)
+    return df
+
+
+def check_process_regression(n=2000):
+    """Fail loudly if the vectorized process_tweets drifts from the row-wise baseline."""
+    now = datetime(2025, 6, 1, 12, 0)
+    raw = make_raw_frame(n)
+    expected = reference_process_tweets(raw.copy(), now)
+    actual = analytics.process_tweets(raw.copy(), now=now, keep_lists=True)
+    # DayOfWeek is categorical now; compare the values
+    actual = actual.astype({"DayOfWeek": expected["DayOfWeek"].dtype})
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    print(f"process_tweets matches the row-wise baseline on {n} rows")
+
+
+def bench_process(sizes=(1000, 10000, 100000), baseline_limit=100000):
+    check_process_regression()
+    now = datetime.now()
+    results = {}
+    for n in sizes:
+        raw = make_raw_frame(n)
+        row = {"rows": n}
+        variants = [("vectorized", lambda df: analytics.process_tweets(df, now=now))]
+        if n <= baseline_limit:
+            variants.append(("rowwise", lambda df: reference_process_tweets(df, now)))
+        for label, process in variants:
+            df = raw.copy()
+            start = time.perf_counter()
+            process(df)
+            row[label] = time.perf_counter() - start
+        speedup = f"  ({row['rowwise'] / row['vectorized']:.1f}x)" if "rowwise" in row else ""
+        print(f"{n:>9,} rows  vectorized {row['vectorized']:.3f}s"
+              + (f"  rowwise {row['rowwise']:.3f}s" if "rowwise" in row else "") + speedup)
+        results[n] = row
+    return results
+
+
+def bench_memory(sizes=(10000, 100000, 500000)):
+    """
+    Frame size and peak RSS growth of process_tweets: the row-wise baseline
+    (int64 counters, string days, per-tweet lists), the default, and
+    low-memory mode without the lists. Peaks are sampled in-process, so
+    treat them as approximate.
+    """
+    import gc
+    import memory
+
+    now = datetime.now()
+    variants = [
+        ("baseline", lambda df: reference_process_tweets(df, now)),
+        ("default", lambda df: analytics.process_tweets(df, now=now, keep_lists=True)),
+        ("low_memory", lambda df: analytics.process_tweets(df, now=now, keep_lists=False)),
+    ]
+    results = {}
+    for n in sizes:
+        raw = make_raw_frame(n)
+        row = []
+        for label, process in variants:
+            gc.collect()
+            with memory.PeakTracker(interval=0.01) as tracker:
+                df = process(raw.copy())
+            frame_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+            results[f"{label}/{n}"] = {"frame_mb": round(frame_mb, 1),
+                                       "peak_mb": round(tracker.peak_mb - tracker.start_mb, 1)}
+            row.append(f"{label} {frame_mb:7.1f} MB (peak +{tracker.peak_mb - tracker.start_mb:5.0f})")
+            del df
+        print(f"{n:>9,} rows  " + "  ".join(row))
+    return results
+
+
+def bench_storage(rows=100000, repeat=5):
+    """
+    Compare full and projected read latency of CSV and Feather user files,
+    and how much of a Feather table ends up on the heap rather than in the
+    memory map (compressed files are decompressed on every read).
+    """
+    df = make_tweet_frame(rows)
+    columns = ["Datetime", "Engagement", "DayOfWeek", "Hour", "HasMedia"]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, compression in (("csv", None), ("feather", "uncompressed"), ("feather", "lz4")):
+            label = fmt if compression in (None, "uncompressed") else f"{fmt}+{compression}"
+            store = storage.get_storage(fmt, data_dir=tmp)
+            previous = storage.FEATHER_COMPRESSION
+            storage.FEATHER_COMPRESSION = compression or previous
+            try:
+                store.save(label, df)
+            finally:
+                storage.FEATHER_COMPRESSION = previous
+            size_mb = os.path.getsize(store.path(label)) / 1e6
+            row = {"size_mb": size_mb}
+            for kind, cols in (("full", None), ("projected", columns)):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    store.load(label, columns=cols)
+                row[kind] = (time.perf_counter() - start) / repeat * 1000
+            heap = ""
+            if fmt == "feather":
+                before = storage.pa.total_allocated_bytes()
+                table = store.load_table(label)
+                row["heap_mb"] = (storage.pa.total_allocated_bytes() - before) / 1e6
+                del table
+                heap = f"  heap {row['heap_mb']:7.1f} MB"
+            print(f"{label:<12} {size_mb:7.1f} MB  full read {row['full']:8.1f} ms  "
+                  f"projected read {row['projected']:8.1f} ms{heap}")
+            results[label] = row
+    return results
+
+
+def _timeit(fn, repeat=3):
+    """Best wall time of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_stats(sizes=(1000, 100000, 1000000), repeat=3):
+    """Time compute_summary, which builds a user's dashboard stats at ingest."""
+    import stats
+
+    results = {}
+    for n in sizes:
+        df = make_tweet_frame(n)
+        results[f"compute_summary/{n}"] = ms = _timeit(lambda: stats.compute_summary(df), repeat)
+        print(f"compute_summary {n:>9,} rows  {ms:9.1f} ms")
+    return results
+
+
+def reference_comparison(store, usernames):
+    """The per-account comparison loop compare.compare_accounts replaced."""
+    import stats
+
+    all_stats = {u: stats.compute_summary(store.load(u, columns=stats.SUMMARY_COLUMNS))
+                 for u in usernames if store.exists(u)}
+    return {
+        'engagement_rank': sorted(all_stats.items(), key=lambda x: x[1]['engagement']['average'],
+                                  reverse=True),
+        'activity_rank': sorted(all_stats.items(), key=lambda x: x[1]['tweet_activity']['total_tweets'],
+                                reverse=True),
+        'media_rank': sorted(all_stats.items(), key=lambda x: x[1]['content_analysis']['media_percentage'],
+                             reverse=True),
+    }
+
+
+def bench_compare(accounts=(10, 100, 1000), rows=200, k=25, baseline_limit=100):
+    """
+    Compare N accounts of `rows` tweets each with compare_accounts (top-k
+    page) against the per-account loop, and check both rank the same.
+    """
+    import compare
+
+    results = {}
+    df = make_tweet_frame(max(accounts) * rows)
+    for n in accounts:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = storage.get_storage(data_dir=tmp)
+            names = [f"acct{i}" for i in range(n)]
+            for i, name in enumerate(names):
+                store.save(name, df.iloc[i * rows:(i + 1) * rows].reset_index(drop=True))
+
+            ms = _timeit(lambda: compare.compare_accounts(store, names, k=k))
+            results[f"compare_accounts/{n}"] = ms
+            row = f"{n:>5} accounts  compare_accounts {ms:8.1f} ms"
+            if n <= baseline_limit:
+                _, rankings, _ = compare.compare_accounts(store, names, k=k)
+                expected = reference_comparison(store, names)
+                for name, ranked in rankings.items():
+                    got = [ranked_stats for _, ranked_stats in ranked]
+                    assert [u for u, _ in ranked] == [u for u, _ in expected[name][:k]], name
+                    assert len(got) == min(k, n)
+                base = _timeit(lambda: reference_comparison(store, names))
+                results[f"compare_loop/{n}"] = base
+                row += f"  per-account loop {base:8.1f} ms  speedup {base / ms:5.1f}x"
+            print(row)
+    return results
+
+
+def bench_output(sizes=(1000, 100000), repeat=3):
+    """
+    Time print_summary (stdout discarded) and the chart renderers, fed
+    from a prebuilt term index and rollups as analytics.main does. Each is
+    run once untimed first, so matplotlib's import isn't counted.
+    """
+    import contextlib
+    import io
+    import rollups
+    import terms
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            df = make_tweet_frame(n)
+            index = terms.TermIndex.from_tweets(df)
+            cube = rollups.Rollups.from_tweets(df)
+            frequencies = index.frequencies("words", analytics.WORDCLOUD_MAX_WORDS)
+            with contextlib.redirect_stdout(io.StringIO()):
+                ms = _timeit(lambda: analytics.print_summary(df, "bench", terms=index, rollups=cube), repeat)
+            results[f"print_summary/{n}"] = ms
+            row = [f"print_summary {ms:8.1f} ms"]
+            for kind, plot in (("heatmap", lambda *a, **kw: analytics.plot_engagement_heatmap(
+                                   *a, pivot=cube.cube(), **kw)),
+                               ("wordcloud", lambda *a, **kw: analytics.plot_wordcloud(
+                                   *a, frequencies=frequencies, **kw))):
+                path = os.path.join(tmp, f"{kind}.png")
+                plot(df, "bench", path=path)  # warm-up
+                ms = _timeit(lambda: plot(df, "bench", path=path), repeat)
+                results[f"plot_{kind}/{n}"] = ms
+                row.append(f"{kind} {ms:8.1f} ms")
+            print(f"{n:>9,} rows  " + "  ".join(row))
+    return results
+
+
+def _term_lists(df, col):
+    # No list columns with LOW_MEMORY=1: re-derive them from the text, as the term index does
+    if col in df:
+        return df[col]
+    return df["Tweet"].str.findall(r"#\w+" if col == "Hashtags" else r"@\w+")
+
+
+def bench_terms(sizes=(1000, 100000), repeat=3):
+    """Build a term index from scratch, then time top-N from it against rescanning the lists."""
+    import terms
+
+    results = {}
+    for n in sizes:
+        df = make_tweet_frame(n)
+        build = _timeit(lambda: terms.TermIndex.from_tweets(df), 1)
+        index = terms.TermIndex.from_tweets(df)
+        indexed = _timeit(lambda: (index.top("hashtags", 5), index.top("mentions", 5)), repeat)
+        rescan = _timeit(lambda: (_term_lists(df, "Hashtags").explode().value_counts().head(5),
+                                  _term_lists(df, "Mentions").explode().value_counts().head(5)), repeat)
+        results.update({f"terms_build/{n}": build, f"terms_top/{n}": indexed, f"terms_rescan/{n}": rescan})
+        print(f"{n:>9,} rows  index build {build:8.1f} ms  top-N from index {indexed:6.2f} ms  "
+              f"rescan {rescan:8.1f} ms")
+    return results
+
+
+def bench_rollups(sizes=(1000, 100000), repeat=3):
+    """Build rollups from scratch, then time the heatmap cube from them against a pivot over raw tweets."""
+    import rollups
+
+    results = {}
+    for n in sizes:
+        df = make_tweet_frame(n)
+        build = _timeit(lambda: rollups.Rollups.from_tweets(df), 1)
+        table = rollups.Rollups.from_tweets(df)
+        cube = _timeit(table.cube, repeat)
+        pivot = _timeit(lambda: df.pivot_table(values="Engagement", index="DayOfWeek",
+                                               columns="Hour", aggfunc="mean"), repeat)
+        results.update({f"rollups_build/{n}": build, f"rollups_cube/{n}": cube, f"rollups_pivot/{n}": pivot})
+        print(f"{n:>9,} rows  rollups build {build:8.1f} ms  cube from rollups {cube:6.2f} ms  "
+              f"pivot {pivot:8.1f} ms  ({len(table.table):,} rollup rows)")
+    return results
+
+
+def bench_end_to_end(pages=10, page_size=20, latency=0.0, repeat=3):
+    """
+    Follow every cursor of a synthetic timeline over HTTP from a local
+    TimelineServer, then run process_tweets on what came back.
+    """
+    def run():
+        url, cursor, records = f"{server.url}/bench", None, []
+        while True:
+            data, cursor = analytics.fetch_timeline(f"{url}?cursor={cursor}" if cursor else url,
+                                                    backend="http")
+            records.extend(data or [])
+            if not cursor:
+                break
+        analytics.process_tweets(pd.DataFrame(records))
+        assert len(records) == pages * page_size, len(records)
+
+    with TimelineServer(pages=pages, page_size=page_size, latency=latency) as server:
+        ms = _timeit(run, repeat)
+    rate = pages * page_size / ms * 1000
+    print(f"end to end   {pages} pages x {page_size} tweets  {ms:8.1f} ms  {rate:,.0f} tweets/sec")
+    return {f"end_to_end/{pages}x{page_size}": ms}
+
+
+def bench_instances(pages=30, rate=3.0):
+    """
+    Page through a timeline across four local instances: a healthy one, a
+    slow one, a flaky one and one that is down. Checks no page is lost and
+    shows where the instance pool sent the traffic.
+    """
+    from instances import InstancePool
+
+    def fetch(url):
+        return analytics.fetch_timeline(url, backend="http")
+
+    servers = [TimelineServer(pages=pages).start(),
+               TimelineServer(pages=pages, latency=0.2).start(),
+               TimelineServer(pages=pages, error_rate=0.5, seed=1).start()]
+    dead = TimelineServer(pages=1)
+    dead.stop()  # nothing listens on its port any more
+    urls = [s.url for s in servers] + [dead.url]
+    try:
+        pool = InstancePool(urls, rate=rate, burst=2, threshold=3, cooldown=30)
+        fetched, cursor = 0, None
+        start = time.perf_counter()
+        while True:
+            data, cursor = pool.fetch(f"/bench?cursor={cursor}" if cursor else "/bench", fetch)
+            assert data is not None, "every instance failed"
+            fetched += 1
+            if not cursor:
+                break
+        elapsed = time.perf_counter() - start
+    finally:
+        for server in servers:
+            server.stop()
+    assert fetched == pages, fetched
+    print(f"{pages} pages in {elapsed:.2f}s over {len(urls)} instances")
+    labels = ["healthy", "slow", "flaky", "down"]
+    for label, status in zip(labels, pool.status()):
+        print(f"  {label:<8} {status['requests']:>4} requests  latency {status['latency_ms']} ms  "
+              f"error rate {status['error_rate']:.2f}  circuit {status['circuit']}")
+    return {f"instances/{pages}": elapsed * 1000}
+
+
+@contextlib.contextmanager
+def _sandbox(tmp):
+    """
+    Point storage, the registry, the page cache and chart output at `tmp`,
+    here and in processes spawned meanwhile, so a benchmark that runs full
+    analyses leaves the real data alone.
+    """
+    import page_cache
+    import registry
+
+    env = {"DATA_DIR": os.path.join(tmp, "data"), "STATIC_DIR": os.path.join(tmp, "static"),
+           "PAGE_CACHE_DIR": os.path.join(tmp, "cache")}
+    for path in env.values():
+        os.makedirs(path)
+    saved_env = {name: os.environ.get(name) for name in env}
+    saved = (analytics.user_storage, analytics.STATIC_DIR, registry._registry, page_cache._cache)
+    os.environ.update(env)
+    analytics.user_storage = storage.get_storage(data_dir=env["DATA_DIR"])
+    analytics.STATIC_DIR = env["STATIC_DIR"]
+    registry._registry = registry.Registry(os.path.join(env["DATA_DIR"], "registry.db"))
+    page_cache._cache = page_cache.PageCache(env["PAGE_CACHE_DIR"])
+    try:
+        yield
+    finally:
+        analytics.user_storage, analytics.STATIC_DIR, registry._registry, page_cache._cache = saved
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def bench_batch(accounts=12, pages=5, latency=0.2, fetch_workers=4, render_workers=None):
+    """
+    Analyse `accounts` synthetic accounts from a local TimelineServer
+    (`latency` seconds per page) one after another, as analytics.main
+    does, then with batch.run_batch. Reports accounts/minute for both.
+    Everything is written to a temporary directory.
+    """
+    import batch
+    import instances
+
+    usernames = [f"bench_batch_{i}" for i in range(accounts)]
+
+    def sequential():
+        for username in usernames:
+            analytics.analyze_user(username, refresh=True)
+            batch.render_account(username)
+
+    def clean():
+        for username in usernames:
+            analytics.user_storage.delete(username)
+
+    server = TimelineServer(pages=pages, page_size=20, latency=latency).start()
+    saved_pool = instances._pool
+    instances._pool = instances.InstancePool([server.url], rate=1000, burst=1000)
+    try:
+        with tempfile.TemporaryDirectory() as tmp, _sandbox(tmp):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                sequential()
+                seq = time.perf_counter() - start
+            clean()
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = batch.run_batch(usernames, fetch_workers=fetch_workers, refresh=True,
+                                         render_workers=render_workers or batch.BATCH_RENDER_WORKERS)
+    finally:
+        instances._pool = saved_pool
+        server.stop()
+    assert not report["failed"], report["failed"]
+    seq_rate = accounts / seq * 60
+    print(f"{accounts} accounts x {pages} pages  sequential {seq:6.1f}s ({seq_rate:6.1f}/min)  "
+          f"batch {report['elapsed_s']:6.1f}s ({report['accounts_per_minute']:6.1f}/min)  "
+          f"{seq / report['elapsed_s']:.1f}x")
+    return {f"batch_sequential/{accounts}": seq * 1000, f"batch/{accounts}": report["elapsed_s"] * 1000}
+
+
+def run_suite(sizes=(1000, 100000, 1000000), plot_limit=100000, output=None):
+    """
+    Every offline benchmark in one run. Results are milliseconds keyed by
+    "benchmark/size", written with the commit hash so runs can be compared.
+    """
+    check_process_regression()
+    results = {}
+    for n in sizes:
+        raw = make_raw_frame(n)
+        results[f"process_tweets/{n}"] = ms = _timeit(lambda: analytics.process_tweets(raw.copy()),
+                                                      1 if n >= 1000000 else 3)
+        print(f"process_tweets {n:>9,} rows  {ms:9.1f} ms")
+    results.update(bench_stats(sizes))
+    results.update(bench_compare())
+    results.update(bench_output([n for n in sizes if n <= plot_limit]))
+    results.update(bench_terms([n for n in sizes if n <= plot_limit]))
+    results.update(bench_rollups([n for n in sizes if n <= plot_limit]))
+    results.update(bench_end_to_end())
+    results.update(bench_instances())
+
+    report = {"commit": _git_commit(), "timestamp": datetime.now().isoformat(), "results": results}
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+    return report
+
+
+def compare_reports(baseline, current, threshold=BENCH_THRESHOLD, min_ms=BENCH_MIN_MS):
+    """
+    Print the change per benchmark. Returns the names that got more than
+    `threshold`x slower, ignoring changes under `min_ms` (timer noise on
+    sub-millisecond benchmarks).
+    """
+    regressions = []
+    print(f"{'benchmark':<32}{'before ms':>12}{'after ms':>12}{'change':>9}")
+    for name, after in sorted(current["results"].items()):
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = after / before if before else 1.0
+        flag = "  REGRESSION" if ratio > threshold and after - before > min_ms else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<32}{before:>12.1f}{after:>12.1f}{ratio:>8.2f}x{flag}")
+    print(f"{len(regressions)} regression(s) vs {baseline.get('commit')} (threshold {threshold}x)")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_importtime(modules=("analytics", "web_dashboard"), history=None, top=8):
+    """
+    Import each module in a fresh interpreter under `-X importtime` and record
+    the cumulative time plus the heaviest dependencies. With `history`, the
+    result is appended as one JSON line so releases can be compared.
+    """
+    result = {"commit": _git_commit(), "timestamp": datetime.now().isoformat(), "modules": {}}
+    for module in modules:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              capture_output=True, text=True)
+        # Children are printed before their parent, indented two more spaces
+        total, heaviest, children = 0, [], []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            depth = (len(name) - len(name.lstrip())) // 2
+            if depth == 1:
+                children.append((int(cumulative), name.strip()))
+            elif depth == 0:
+                if name.strip() == module:
+                    total, heaviest = int(cumulative), sorted(children, reverse=True)
+                children = []
+        result["modules"][module] = {
+            "total_ms": total / 1000,
+            "heaviest": {name: us / 1000 for us, name in heaviest[:top]},
+        }
+        print(f"{module:<15} {total / 1000:8.1f} ms  "
+              + ", ".join(f"{name} {us / 1000:.0f}ms" for us, name in heaviest[:4]))
+    if history:
+        with open(history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X-Stats benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fetch", help="compare HTTP and Selenium fetch backends")
+    p.add_argument("url")
+    p.add_argument("--pages", type=int, default=5)
+
+    p = sub.add_parser("parse", help="time the HTML parser on a saved page")
+    p.add_argument("path")
+    p.add_argument("--repeat", type=int, default=50)
+
+    p = sub.add_parser("extract", help="compare Selenium DOM extraction modes")
+    p.add_argument("url")
+    p.add_argument("--repeat", type=int, default=10)
+
+    p = sub.add_parser("process", help="time process_tweets against the row-wise baseline")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    p = sub.add_parser("memory", help="frame size and peak RSS of process_tweets per mode")
+    p.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+
+    p = sub.add_parser("storage", help="compare CSV and Feather read latency")
+    p.add_argument("--rows", type=int, default=100000)
+    p.add_argument("--repeat", type=int, default=5)
+
+    p = sub.add_parser("compare", help="time the N-account comparison")
+    p.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000])
+    p.add_argument("--rows", type=int, default=200, help="tweets per account")
+
+    p = sub.add_parser("instances", help="rotate over local healthy, slow, flaky and dead instances")
+    p.add_argument("--pages", type=int, default=30)
+    p.add_argument("--rate", type=float, default=3.0, help="requests/sec allowed per instance")
+
+    p = sub.add_parser("batch", help="sequential vs pipelined analysis of many accounts")
+    p.add_argument("--accounts", type=int, default=12)
+    p.add_argument("--pages", type=int, default=5)
+    p.add_argument("--latency", type=float, default=0.2, help="seconds per page")
+    p.add_argument("--fetch-workers", type=int, default=4)
+    p.add_argument("--render-workers", type=int)
+
+    p = sub.add_parser("suite", help="run every offline benchmark on synthetic data")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    p.add_argument("--plot-limit", type=int, default=100000,
+                   help="largest size to render charts and print_summary for")
+    p.add_argument("--output", help="write the results as JSON to this file")
+    p.add_argument("--compare", metavar="FILE",
+                   help="fail on regressions against these results, e.g. benchmarks/baseline.json")
+    p.add_argument("--threshold", type=float, default=BENCH_THRESHOLD,
+                   help="slowdown factor counted as a regression")
+
+    p = sub.add_parser("importtime", help="measure module import time (-X importtime)")
+    p.add_argument("--modules", nargs="+", default=["analytics", "web_dashboard"])
+    p.add_argument("--history", help="append the result as a JSON line to this file")
+
+    args = parser.parse_args()
+    if args.command == "fetch":
+        bench_fetch(args.url, args.pages)
+    elif args.command == "parse":
+        bench_parse(args.path, args.repeat)
+    elif args.command == "extract":
+        bench_extraction(args.url, args.repeat)
+    elif args.command == "process":
+        bench_process(args.sizes)
+    elif args.command == "memory":
+        bench_memory(args.sizes)
+    elif args.command == "storage":
+        bench_storage(args.rows, args.repeat)
+    elif args.command == "compare":
+        bench_compare(args.accounts, args.rows)
+    elif args.command == "instances":
+        bench_instances(args.pages, args.rate)
+    elif args.command == "batch":
+        bench_batch(args.accounts, args.pages, args.latency, args.fetch_workers, args.render_workers)
+    elif args.command == "suite":
+        report = run_suite(args.sizes, args.plot_limit, args.output)
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as f:
+                baseline = json.load(f)
+            if compare_reports(baseline, report, args.threshold):
+                sys.exit(1)  # a regression fails the run (and CI)
+    elif args.command == "importtime":
+        bench_importtime(args.modules, args.history)
+
+
+if __name__ == "__main__":
+    main()
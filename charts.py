@@ -0,0 +1,170 @@
+"""
+On-demand chart rendering.
+
+Charts are rendered the first time they are requested, stored under a hash
+of the data they are drawn from and served from disk afterwards. The cache
+directory is size-bounded and evicts the least recently used files.
+"""
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import analytics
+from stats import LRUCache
+from terms import get_terms
+from rollups import get_rollups
+
+CHART_DIR = os.path.join("static", "charts")
+CHART_CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_MB", 200)) * 1024 * 1024
+
+def _heatmap_input(storage, username):
+    return get_rollups(storage, username).cube()
+
+
+def _plot_heatmap(pivot, username, path):
+    return analytics.plot_engagement_heatmap(None, username, path=path, pivot=pivot, quiet=True)
+
+
+def _timeline_input(storage, username):
+    return get_rollups(storage, username).series("W")[["count", "Engagement"]]
+
+
+def _plot_timeline(series, username, path):
+    return analytics.plot_engagement_timeline(None, username, path=path, series=series,
+                                              quiet=True)
+
+
+def _wordcloud_input(storage, username):
+    frequencies = get_terms(storage, username).frequencies("words", analytics.WORDCLOUD_MAX_WORDS)
+    return pd.Series(frequencies, dtype="int64")
+
+
+def _plot_wordcloud(frequencies, username, path):
+    return analytics.plot_wordcloud(None, username, path=path, frequencies=frequencies.to_dict(),
+                                    quiet=True)
+
+
+# kind -> (loads the data the chart is drawn from, render function)
+CHART_KINDS = {
+    "heatmap": (_heatmap_input, _plot_heatmap),
+    "wordcloud": (_wordcloud_input, _plot_wordcloud),
+    "timeline": (_timeline_input, _plot_timeline),
+}
+
+
+def chart_digest(data, username, kind):
+    """Content address for a chart: its kind, title and input data."""
+    h = hashlib.sha1(f"{kind}:{username}".encode())
+    if isinstance(data, pd.DataFrame):
+        # Row hashes cover values and index only; the heatmap's hours are its columns
+        h.update(repr(list(data.columns)).encode())
+    h.update(pd.util.hash_pandas_object(data).values.tobytes())
+    return h.hexdigest()[:20]
+
+
+class ChartCache:
+    def __init__(self, storage, chart_dir=CHART_DIR, max_bytes=CHART_CACHE_MAX_BYTES, registry=None):
+        self.storage = storage
+        self.registry = registry  # records which user each chart belongs to
+        # Absolute: Flask resolves relative directories against the app root, not the cwd
+        self.chart_dir = os.path.abspath(chart_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.chart_dir, exist_ok=True)
+        # pyplot is not thread-safe: a single worker renders everything
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="charts")
+        # Re-entrant: an instantly finished render calls _forget under get's lock
+        self._lock = threading.RLock()
+        self._inflight = {}
+        # (username, kind, mtime, size) -> chart path, so hits skip hashing
+        self._paths = LRUCache()
+        # Running size of chart_dir, so only a render that crosses max_bytes
+        # scans it; only the render thread touches it
+        self._bytes = None
+
+    def _render(self, kind, username, data, path):
+        _, plot = CHART_KINDS[kind]
+        tmp = f"{path}.{threading.get_ident()}.tmp.png"
+        try:
+            if plot(data, username, path=tmp) is None:
+                return None
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        print(f"Saved {kind}: {path}")
+        if self.registry is not None:
+            self.registry.record_chart(username, kind, path, os.path.getsize(path))
+        if self._bytes is not None:
+            self._bytes += os.path.getsize(path)
+        if self._bytes is None or self._bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def get(self, username, kind):
+        """Path to the rendered chart, rendering it first if needed. None if it can't be drawn."""
+        version = self.storage.version(username)
+        if version is None or kind not in CHART_KINDS:
+            return None
+        key = (username, kind, *version)
+        path = self._paths.get(key)
+        load, _ = CHART_KINDS[kind]
+        if path is None:
+            data = load(self.storage, username)
+            path = os.path.join(self.chart_dir, f"{kind}-{chart_digest(data, username, kind)}.png")
+        else:
+            data = None
+
+        if os.path.exists(path):
+            os.utime(path)  # mark as recently used
+            self._paths.put(key, path)
+            return path
+
+        with self._lock:
+            future = self._inflight.get(path)
+            if future is None and os.path.exists(path):  # finished while we waited
+                self._paths.put(key, path)
+                return path
+            if future is None:
+                if data is None:
+                    data = load(self.storage, username)
+                future = self._executor.submit(self._render, kind, username, data, path)
+                self._inflight[path] = future
+                future.add_done_callback(lambda f: self._forget(path, f))
+        result = future.result()
+        if result is not None:
+            self._paths.put(key, result)
+        return result
+
+    def _forget(self, path, future):
+        with self._lock:
+            if self._inflight.get(path) is future:
+                del self._inflight[path]
+
+    def evict(self):
+        """
+        Delete least recently used charts until the directory fits in
+        max_bytes. Returns the size left.
+        """
+        entries = []
+        for entry in os.scandir(self.chart_dir):
+            if entry.is_file() and entry.name.endswith(".png") and ".tmp" not in entry.name:
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+        if removed and self.registry is not None:
+            self.registry.forget_charts(removed)
+        self._bytes = total
+        return total
@@ -0,0 +1,138 @@
+"""
+N-account comparison.
+
+All requested accounts are read in parallel into one frame keyed by
+username, every per-account metric comes out of a single grouped
+aggregation, and rankings are top-k selections with offset pagination,
+so comparing hundreds of accounts costs about as much as one big frame.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+COMPARE_LOAD_WORKERS = int(os.environ.get("COMPARE_LOAD_WORKERS", 8))
+# Metrics tables kept for recently compared account sets
+COMPARE_CACHE_SIZE = int(os.environ.get("COMPARE_CACHE_SIZE", 64))
+
+# Columns the comparison reads; projected on load
+COMPARE_COLUMNS = ['Engagement', 'WordCount', 'DayOfWeek', 'Hour',
+                   'HasHashtags', 'HasMentions', 'HasLinks', 'HasMedia']
+
+# ranking name -> metric column it is ordered by
+RANKINGS = {
+    'engagement_rank': 'engagement_average',
+    'activity_rank': 'total_tweets',
+    'media_rank': 'media_percentage',
+}
+
+
+def load_accounts(storage, usernames, workers=COMPARE_LOAD_WORKERS):
+    """
+    One frame holding every account's tweets, with a categorical `username`
+    column. Accounts without data are left out.
+    """
+    frame, counts = storage.load_many(list(dict.fromkeys(usernames)), COMPARE_COLUMNS, workers)
+    names = [u for u, _ in counts]
+    codes = np.repeat(np.arange(len(names)), [n for _, n in counts])
+    frame.insert(0, 'username', pd.Categorical.from_codes(codes, categories=names))
+    return frame
+
+
+def account_metrics(frame):
+    """Per-account metrics, one row per username, in one grouped aggregation."""
+    grouped = frame.groupby('username', observed=True, sort=False)
+    table = grouped.agg(
+        total_tweets=('Engagement', 'size'),
+        engagement_total=('Engagement', 'sum'),
+        engagement_average=('Engagement', 'mean'),
+        engagement_peak=('Engagement', 'max'),
+        hashtags_percentage=('HasHashtags', 'mean'),
+        mentions_percentage=('HasMentions', 'mean'),
+        links_percentage=('HasLinks', 'mean'),
+        media_percentage=('HasMedia', 'mean'),
+        avg_word_count=('WordCount', 'mean'),
+    )
+    table['engagement_average'] = table['engagement_average'].round(2)
+    for col in ('hashtags_percentage', 'mentions_percentage', 'links_percentage', 'media_percentage'):
+        table[col] = (table[col] * 100).round(1)
+    table['avg_word_count'] = table['avg_word_count'].round(1)
+
+    # Best posting day and hour: mean engagement per (account, slot), best slot per account
+    for slot, col in (('DayOfWeek', 'best_day'), ('Hour', 'best_hour')):
+        means = frame.groupby(['username', slot], observed=True)['Engagement'].mean()
+        best = means.groupby(level=0, observed=True).idxmax()
+        table[col] = best.map(lambda key: key[1]).reindex(table.index)
+    table.index = table.index.astype(str)
+    return table
+
+
+def account_table(storage, usernames, cache=None):
+    """
+    account_metrics for the given accounts, empty if none has data. With a
+    `cache` (stats.LRUCache) the table is kept per set of data file
+    versions, so paging through a comparison reads the files once.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    key = tuple((u, storage.version(u)) for u in usernames)
+    table = cache.get(key) if cache is not None else None
+    if table is None:
+        frame = load_accounts(storage, usernames)
+        table = account_metrics(frame) if not frame.empty else pd.DataFrame()
+        if cache is not None:
+            cache.put(key, table)
+    return table
+
+
+def top_k(table, column, k=None, offset=0):
+    """(username, value) pairs ranked by `column`, descending, rows offset..offset+k."""
+    if k is None:
+        ranked = table[column].sort_values(ascending=False, kind='stable')
+    else:
+        ranked = table[column].nlargest(offset + k, keep='first')
+    return list(ranked.iloc[offset:].items())
+
+
+def _account_stats(row):
+    """A metrics row in the shape of the matching summary sections (see stats.compute_summary)."""
+    best_day = row['best_day'] if isinstance(row['best_day'], str) else 'N/A'
+    best_hour = int(row['best_hour']) if pd.notna(row['best_hour']) else 0
+    return {
+        'tweet_activity': {'total_tweets': int(row['total_tweets'])},
+        'engagement': {
+            'total': int(row['engagement_total']),
+            'average': float(row['engagement_average']),
+            'peak': int(row['engagement_peak']),
+        },
+        'content_analysis': {
+            'hashtags_percentage': float(row['hashtags_percentage']),
+            'mentions_percentage': float(row['mentions_percentage']),
+            'links_percentage': float(row['links_percentage']),
+            'media_percentage': float(row['media_percentage']),
+            'avg_word_count': float(row['avg_word_count']),
+        },
+        'posting_patterns': {
+            'optimal_time': f"{best_day} at {best_hour:02d}:00" if best_day != 'N/A' else 'N/A',
+            'best_day': best_day,
+            'best_hour': best_hour,
+        },
+    }
+
+
+def compare_accounts(storage, usernames, k=None, offset=0, cache=None):
+    """
+    Rank the given accounts. Returns (stats, rankings, total): stats maps
+    every account that appears on the requested ranking page to its
+    metrics, rankings maps each name in RANKINGS to (username, stats) pairs,
+    and total is the number of accounts with data. See account_table for
+    `cache`.
+    """
+    table = account_table(storage, usernames, cache)
+    if table.empty:
+        return {}, {name: [] for name in RANKINGS}, 0
+
+    pages = {name: top_k(table, column, k, offset) for name, column in RANKINGS.items()}
+    on_page = dict.fromkeys(u for ranked in pages.values() for u, _ in ranked)
+    stats = {u: _account_stats(row) for u, row in table.loc[list(on_page)].iterrows()}
+    rankings = {name: [(u, stats[u]) for u, _ in ranked] for name, ranked in pages.items()}
+    return stats, rankings, len(table)
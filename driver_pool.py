@@ -0,0 +1,192 @@
+import os
+import atexit
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import WebDriverException, TimeoutException
+
+import metrics
+from memory import CHROME_MEMORY_MB, LOW_MEMORY, get_memory_budget
+
+# Pool tuning, overridable from the environment
+POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", 1 if LOW_MEMORY else 2))
+POOL_WARMUP = int(os.environ.get("DRIVER_POOL_WARMUP", 0))
+MAX_PAGES_PER_DRIVER = int(os.environ.get("DRIVER_MAX_PAGES", 50))
+
+
+def chrome_options():
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument(f"user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                         "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    options.add_argument("--log-level=3")
+    options.add_experimental_option("excludeSwitches", ["enable-logging"])
+    return options
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class DriverPool:
+    """
+    Bounded pool of headless Chrome drivers.
+
+    Drivers are created lazily up to `size`, checked back in after each use
+    and recycled after `max_pages` page loads or when they stop responding.
+    Under a memory budget a new Chrome is only launched if it fits; otherwise
+    the caller waits for a running one, and drivers are closed rather than
+    kept idle while the process is over budget.
+    """
+
+    def __init__(self, size=POOL_SIZE, warmup=POOL_WARMUP, max_pages=MAX_PAGES_PER_DRIVER):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._live = set()
+        self._closed = False
+        self.warm_up(min(warmup, self.size))
+
+    def _launch(self):
+        with metrics.timed("driver_launch"):
+            pooled = _PooledDriver(webdriver.Chrome(options=chrome_options()))
+        with self._lock:
+            self._live.add(pooled)
+        return pooled
+
+    def _discard(self, pooled):
+        with self._lock:
+            self._live.discard(pooled)
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    def _healthy(self, pooled):
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return False
+        try:
+            pooled.driver.current_url  # cheap round-trip to the browser
+            return True
+        except Exception:
+            return False
+
+    def warm_up(self, count):
+        """Start `count` drivers up front so the first analyses skip the cold start."""
+        for _ in range(count):
+            try:
+                self._idle.put(self._launch())
+            except WebDriverException as e:
+                print("Driver warm-up failed:", repr(e))
+                break
+
+    def _next_idle(self, deadline):
+        """An idle driver, or None once a new one may be launched."""
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if not self._live or get_memory_budget().fits(CHROME_MEMORY_MB):
+                return None
+            # Over budget with drivers running: wait for one to come back
+            # (or be closed, which frees room for a new one)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("No Chrome driver fits in the memory budget")
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                pass
+
+    def _checkout(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("No Chrome driver available in pool")
+        try:
+            while True:
+                pooled = self._next_idle(deadline)
+                if pooled is None:
+                    return self._launch()
+                if self._healthy(pooled):
+                    return pooled
+                self._discard(pooled)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, pooled, broken=False):
+        try:
+            if (broken or self._closed or not self._healthy(pooled)
+                    or get_memory_budget().over_budget()):
+                self._discard(pooled)
+            else:
+                self._idle.put(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Borrow a driver; it is returned to the pool (or recycled on crash) on exit."""
+        if self._closed:
+            raise RuntimeError("Driver pool is shut down")
+        pooled = self._checkout(timeout)
+        broken = False
+        try:
+            yield pooled.driver
+        except TimeoutException:
+            # Slow page, not a dead browser; the check-in health check decides
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            pooled.pages += 1
+            self._checkin(pooled, broken)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            remaining = list(self._live)
+        for pooled in remaining:
+            self._discard(pooled)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool()
+        return _pool
+
+
+def shutdown_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+atexit.register(shutdown_driver_pool)
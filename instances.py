@@ -0,0 +1,187 @@
+"""
+Nitter instance rotation.
+
+Requests are spread over every configured instance. Each instance has a
+token bucket so no single one is hammered, a health score from its recent
+latency and error rate, and a circuit breaker that takes it out of rotation
+for a cooldown after repeated failures. A failed page is retried on the
+next best instance.
+"""
+import os
+import threading
+import time
+
+import metrics
+
+NITTER_INSTANCES = [
+    url.strip().rstrip("/")
+    for url in (os.environ.get("NITTER_INSTANCES") or os.environ.get("NITTER_INSTANCE")
+                or "https://nitter.net").split(",")
+    if url.strip()
+]
+# Sustained requests per second and burst size allowed per instance
+INSTANCE_RATE = float(os.environ.get("INSTANCE_RATE", 0.5))
+INSTANCE_BURST = int(os.environ.get("INSTANCE_BURST", 3))
+# Consecutive failures that open an instance's circuit, and for how long
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", 3))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 60))
+FETCH_ATTEMPTS = int(os.environ.get("FETCH_ATTEMPTS", 3))
+# Seconds a failed request counts as (the fetch timeout): failures weigh in
+# the latency average at least this much, so an instance that errors fast
+# or times out never ranks above a healthy one
+FAILURE_PENALTY = float(os.environ.get("INSTANCE_FAILURE_PENALTY", 30))
+
+# Weight of the newest sample in the latency / error moving averages
+_ALPHA = 0.3
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`. Not thread-safe on its own."""
+
+    def __init__(self, rate=INSTANCE_RATE, burst=INSTANCE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available."""
+        self._refill(now)
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        """Spend a token, borrowing against the future if none is left."""
+        self._refill(now)
+        self.tokens -= 1
+
+
+class Instance:
+    def __init__(self, url, rate=INSTANCE_RATE, burst=INSTANCE_BURST):
+        self.url = url
+        self.bucket = TokenBucket(rate, burst)
+        self.latency = None      # moving average, seconds
+        self.error_rate = 0.0    # moving average of failures
+        self.failures = 0        # consecutive
+        self.open_until = 0.0    # circuit open (ejected) until this monotonic time
+        self.requests = 0
+
+    def is_open(self, now):
+        return now < self.open_until
+
+    def score(self, now):
+        """Expected cost of sending the next request here; lower is better."""
+        # Untried instances score as fast so each one gets probed
+        latency = self.latency if self.latency is not None else 0.0
+        return (latency * (1 + 4 * self.error_rate) + self.error_rate * FAILURE_PENALTY
+                + self.bucket.delay(now))
+
+    def status(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            "url": self.url,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "circuit": "open" if self.is_open(now) else "closed",
+        }
+
+
+class InstancePool:
+    def __init__(self, urls=None, rate=INSTANCE_RATE, burst=INSTANCE_BURST,
+                 threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, attempts=FETCH_ATTEMPTS):
+        urls = urls or NITTER_INSTANCES
+        self.instances = [Instance(url, rate, burst) for url in urls]
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.attempts = max(1, attempts)
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=()):
+        """
+        Reserve a request slot on the best instance not in `exclude` and
+        wait for its rate limit. Instances with an open circuit are skipped
+        unless every candidate is open, in which case the one closest to
+        the end of its cooldown gets a trial request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [i for i in self.instances if i not in exclude] or self.instances
+            closed = [i for i in candidates if not i.is_open(now)]
+            if closed:
+                instance = min(closed, key=lambda i: i.score(now))
+            else:
+                instance = min(candidates, key=lambda i: i.open_until)
+            wait = instance.bucket.delay(now)
+            instance.bucket.take(now)
+            instance.requests += 1
+        if wait:
+            metrics.observe("xstats_rate_limit_wait_seconds", wait, instance=instance.url)
+            time.sleep(wait)
+        return instance
+
+    def record(self, instance, ok, latency):
+        with self._lock:
+            sample = 0.0 if ok else 1.0
+            instance.error_rate += _ALPHA * (sample - instance.error_rate)
+            if not ok:
+                latency = max(latency, FAILURE_PENALTY)
+            instance.latency = latency if instance.latency is None else (
+                instance.latency + _ALPHA * (latency - instance.latency))
+            if ok:
+                instance.failures = 0
+                instance.open_until = 0.0
+            else:
+                instance.failures += 1
+                if instance.failures >= self.threshold:
+                    instance.open_until = time.monotonic() + self.cooldown
+                    metrics.inc("xstats_circuit_opened_total", instance=instance.url)
+                    print(f"Taking {instance.url} out of rotation for {self.cooldown:.0f}s "
+                          f"after {instance.failures} failures")
+        metrics.inc("xstats_instance_requests_total", instance=instance.url,
+                    outcome="ok" if ok else "error")
+
+    def fetch(self, path, fetch):
+        """
+        Call `fetch(url)` for `path` on the best instance, retrying on others
+        while it raises or returns no records. `fetch` should raise on HTTP
+        errors rather than fall back to a slower backend, so a failing
+        instance is rotated out right away. Returns fetch's (records, cursor).
+        """
+        tried = []
+        data, cursor = None, None
+        for _ in range(min(self.attempts, len(self.instances)) or 1):
+            instance = self.acquire(exclude=tried)
+            tried.append(instance)
+            start = time.perf_counter()
+            try:
+                data, cursor = fetch(instance.url + path)
+            except Exception as e:
+                print(f"Fetch from {instance.url} failed: {e!r}")
+                data, cursor = None, None
+            self.record(instance, data is not None, time.perf_counter() - start)
+            if data is not None:
+                break
+        return data, cursor
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            return [i.status(now) for i in self.instances]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_instance_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InstancePool()
+        return _pool
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics
+import memory
+from worker import WorkerClient
+
+ANALYSIS_WORKER_ADDRESS = os.environ.get("ANALYSIS_WORKER_ADDRESS")
+ANALYSIS_CONCURRENCY = int(os.environ.get("ANALYSIS_CONCURRENCY", 2))
+MAX_TRACKED_JOBS = 500
+
+def run_analysis(username, max_tweets=20):
+    """
+    Fetch and process one user, in the warm worker process if one is
+    configured (ANALYSIS_WORKER_ADDRESS), otherwise in-process under the
+    memory budget. Returns the tweet count and the peak RSS while it ran.
+    Charts are rendered on first view, not here.
+    """
+    if ANALYSIS_WORKER_ADDRESS:
+        return WorkerClient(ANALYSIS_WORKER_ADDRESS).analyze(username, max_tweets)
+    with memory.job(f"@{username}") as usage:
+        tweets = analytics.analyze_user(username, max_tweets)
+    if not tweets:
+        raise ValueError(f"No data found for @{username}")
+    return {"tweets": tweets, "peak_rss_mb": round(usage.peak_mb, 1)}
+
+
+class Job:
+    """One dashboard request; usernames already in flight share their future."""
+
+    def __init__(self, usernames, futures):
+        self.id = uuid.uuid4().hex
+        self.usernames = usernames
+        self.futures = futures
+        self.created = time.time()
+
+    def _user_status(self, future):
+        if future.running():
+            return {"state": "running"}
+        if not future.done():
+            return {"state": "queued"}
+        if future.exception() is not None:
+            return {"state": "failed", "error": str(future.exception())}
+        return {"state": "done", **future.result()}
+
+    def status(self):
+        users = {u: self._user_status(f) for u, f in self.futures.items()}
+        states = {s["state"] for s in users.values()}
+        if states <= {"done", "failed"}:
+            state = "failed" if states == {"failed"} else "done"
+        elif states & {"running", "done", "failed"}:
+            state = "running"
+        else:
+            state = "queued"
+        return {"id": self.id, "state": state, "usernames": self.usernames, "users": users}
+
+
+class JobQueue:
+    def __init__(self, max_workers=ANALYSIS_CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="analysis")
+        # Re-entrant: a future that finishes instantly runs _forget under submit's lock
+        self._lock = threading.RLock()
+        self._inflight = {}
+        self._jobs = OrderedDict()
+
+    def _forget(self, username, future):
+        with self._lock:
+            if self._inflight.get(username) is future:
+                del self._inflight[username]
+
+    def submit(self, usernames):
+        with self._lock:
+            futures = {}
+            for username in usernames:
+                future = self._inflight.get(username)
+                if future is None:
+                    future = self._executor.submit(run_analysis, username)
+                    self._inflight[username] = future
+                    future.add_done_callback(lambda f, u=username: self._forget(u, f))
+                futures[username] = future
+            job = Job(usernames, futures)
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_TRACKED_JOBS:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
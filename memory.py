@@ -0,0 +1,177 @@
+"""
+Memory budget for small hosts.
+
+LOW_MEMORY=1 shrinks the defaults for a 512 MB instance: a 400 MB RSS
+budget, one Chrome driver, smaller processing chunks and no per-tweet
+hashtag/mention/link lists (they are re-derived from the text when
+needed). With a budget set, analyses and Chrome launches are admitted
+only while the process stays under it, and every analysis reports the
+peak RSS seen while it ran.
+
+RSS is read with psutil when installed (Chrome children included),
+otherwise from /proc for this process alone.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+LOW_MEMORY = os.environ.get("LOW_MEMORY", "0") == "1"
+# Total RSS the app may use; 0 turns admission control off
+MEMORY_BUDGET_MB = float(os.environ.get("MEMORY_BUDGET_MB", 400 if LOW_MEMORY else 0))
+# Expected footprint of one analysis and one headless Chrome
+JOB_MEMORY_MB = float(os.environ.get("JOB_MEMORY_MB", 100))
+CHROME_MEMORY_MB = float(os.environ.get("CHROME_MEMORY_MB", 250))
+# Rows processed or read at a time for big histories
+CHUNK_ROWS = int(os.environ.get("CHUNK_ROWS", 10000 if LOW_MEMORY else 50000))
+# Store hashtag/mention/link lists per tweet (off in low-memory mode)
+KEEP_LISTS = os.environ.get("KEEP_LISTS", "0" if LOW_MEMORY else "1") == "1"
+
+_SAMPLE_INTERVAL = 0.05
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb():
+    """Current resident memory of this process and its children (Chrome), in MB."""
+    if psutil is not None:
+        proc = psutil.Process()
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 1024 / 1024
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+    except OSError:
+        import resource  # Unix only
+        # Peak rather than current, but the best portable figure there is
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemoryBudget:
+    """
+    Admission control against an RSS budget.
+
+    Jobs reserve their expected footprint before starting; a reservation
+    is granted while max(baseline + reserved, measured RSS) plus the request
+    fits in the budget. The first reservation is always granted so work
+    never stalls on a budget smaller than one job. Chrome launches only
+    check fits() without reserving: a browser outlives the job that
+    started it, and its RSS is measured anyway.
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self.baseline_mb = rss_mb()
+        self.reserved_mb = 0.0
+        self.holders = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, mb):
+        if not self.budget_mb or not self.holders:
+            return True
+        committed = max(self.baseline_mb + self.reserved_mb, rss_mb())
+        return committed + mb <= self.budget_mb
+
+    def fits(self, mb):
+        with self._cond:
+            return self._fits(mb)
+
+    def over_budget(self):
+        return bool(self.budget_mb) and rss_mb() > self.budget_mb
+
+    def acquire(self, mb, block=True, timeout=None):
+        """Reserve `mb`; returns False if it doesn't fit and block is False or timeout passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._fits(mb):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        return False
+                    # Re-check periodically too: RSS drops without anyone releasing
+                    self._cond.wait(0.5 if remaining is None else min(0.5, remaining))
+            finally:
+                self.waiting -= 1
+            self.reserved_mb += mb
+            self.holders += 1
+            return True
+
+    def release(self, mb):
+        with self._cond:
+            self.reserved_mb = max(0.0, self.reserved_mb - mb)
+            self.holders = max(0, self.holders - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, mb):
+        self.acquire(mb)
+        try:
+            yield
+        finally:
+            self.release(mb)
+
+    def status(self):
+        with self._cond:
+            return {"budget_mb": self.budget_mb, "reserved_mb": self.reserved_mb,
+                    "holders": self.holders, "waiting": self.waiting,
+                    "rss_mb": round(rss_mb(), 1)}
+
+
+class PeakTracker:
+    """Samples RSS in a background thread; `peak_mb` is the highest value seen."""
+
+    def __init__(self, interval=_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb = self.peak_mb = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+        return False
+
+
+@contextmanager
+def job(label, mb=JOB_MEMORY_MB):
+    """
+    Run one analysis under the memory budget and report its peak RSS.
+    The peak is process-wide, so it includes anything running alongside.
+    """
+    budget = get_memory_budget()
+    with budget.reserve(mb), PeakTracker() as tracker:
+        yield tracker
+    print(f"Peak RSS for {label}: {tracker.peak_mb:.0f} MB "
+          f"(+{tracker.peak_mb - tracker.start_mb:.0f} MB)")
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_memory_budget():
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget()
+        return _budget
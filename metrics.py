@@ -0,0 +1,138 @@
+"""
+Lightweight per-stage timing and counters.
+
+Disabled by default: timed() hands back a shared no-op context manager and
+inc() returns after one flag check, so instrumented hot paths cost next to
+nothing. The web app enables it and exposes everything at /metrics in the
+Prometheus text format; `python analytics.py --profile` prints a breakdown.
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+# Upper bounds in seconds, from DOM extraction up to full page loads
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_NULL = nullcontext()
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    return _enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("xstats_stage_duration_seconds", time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+def timed(stage):
+    """Context manager recording how long a pipeline stage took."""
+    if not _enabled:
+        return _NULL
+    return _Timer(stage)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus(gauges=None):
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(BUCKETS, hist):
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {count}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {hist[-2]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {hist[-1]}")
+
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def print_breakdown():
+    """Per-stage timing table plus counters, for --profile."""
+    with _lock:
+        stages = [(dict(labels).get("stage"), hist[-2], hist[-1])
+                  for (name, labels), hist in _histograms.items()
+                  if name == "xstats_stage_duration_seconds"]
+        counters = dict(_counters)
+    total = sum(seconds for _, seconds, _ in stages) or 1.0
+    print("\nStage breakdown:")
+    print(f"{'stage':<18}{'calls':>7}{'total s':>10}{'mean ms':>10}{'share':>8}")
+    for stage, seconds, count in sorted(stages, key=lambda s: -s[1]):
+        print(f"{stage:<18}{count:>7}{seconds:>10.3f}{seconds / count * 1000:>10.1f}"
+              f"{seconds / total * 100:>7.1f}%")
+    for (name, labels), value in sorted(counters.items()):
+        print(f"{name}{_fmt_labels(labels)}: {value}")
@@ -0,0 +1,138 @@
+"""
+On-disk cache of fetched timeline pages.
+
+Each entry holds the records extracted from one page plus its "Load more"
+cursor, keyed by username and cursor, so analysing the same account again
+within PAGE_CACHE_TTL seconds skips the scrape entirely. Entries are written
+atomically and can be shared by several worker processes; the directory is
+size-bounded and evicts the least recently used entries.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+import metrics
+from storage import _atomic_write
+
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR", os.path.join("cache", "pages"))
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", 900))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_MB", 100)) * 1024 * 1024
+
+
+class PageCache:
+    def __init__(self, cache_dir=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.bytes_saved = 0
+        # Running size of the directory, so only a put that crosses max_bytes
+        # scans it. Other processes' writes show up at the next scan.
+        self._bytes = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, username, cursor):
+        key = hashlib.sha1(f"{username.lower()}\0{cursor or ''}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _count(self, result, size=0):
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+                self.expired += result == "expired"
+        metrics.inc("xstats_page_cache_requests_total", result=result)
+        if size:
+            metrics.inc("xstats_page_cache_bytes_saved_total", size)
+
+    def get(self, username, cursor=None):
+        """(records, next_cursor) of a fresh cached page, or None."""
+        if self.ttl <= 0:
+            return None
+        path = self.path(username, cursor)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count("miss")
+            return None
+        if time.time() - entry["fetched_at"] > self.ttl:
+            self._count("expired")
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        self._count("hit", entry.get("bytes", 0))
+        return entry["records"], entry["cursor"]
+
+    def put(self, username, cursor, records, next_cursor):
+        if self.ttl <= 0 or records is None:
+            return
+        payload = {"username": username, "fetched_at": time.time(),
+                   "records": records, "cursor": next_cursor}
+        payload["bytes"] = len(json.dumps(payload))
+
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+        path = self.path(username, cursor)
+        _atomic_write(path, write)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += os.path.getsize(path)  # overwrites count twice until the next scan
+            full = self._bytes is None or self._bytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the directory fits in
+        max_bytes. Returns the size left.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".json"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._bytes = total
+        return total
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'expired': self.expired,
+                    'bytes_saved': self.bytes_saved,
+                    'hit_rate': round(self.hits / total, 3) if total else 0.0}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PageCache()
+        return _cache
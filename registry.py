@@ -0,0 +1,162 @@
+"""
+Registry of analysed users.
+
+A small SQLite index (data/registry.db) of every user's data file, last
+fetch time, row count, size and rendered charts. The dashboard lists users
+from it instead of scanning directories, and a background janitor uses it
+to enforce the retention quota. Analyses running in worker processes write
+to the same database.
+"""
+import os
+import time
+import sqlite3
+import threading
+
+from storage import DATA_DIR
+
+REGISTRY_PATH = os.path.join(DATA_DIR, "registry.db")
+# Retention policy applied by the janitor; 0 turns a limit off. Incremental
+# refreshes build on the stored history, so the age limit is long: a user
+# removed for age is scraped from scratch, and only back as far as
+# Nitter's timeline still reaches.
+DATA_MAX_AGE_HOURS = float(os.environ.get("DATA_MAX_AGE_HOURS", 24 * 30))
+MAX_USERS = int(os.environ.get("MAX_USERS", 500))
+DATA_QUOTA_MB = float(os.environ.get("DATA_QUOTA_MB", 500))
+JANITOR_INTERVAL = float(os.environ.get("JANITOR_INTERVAL", 300))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username   TEXT PRIMARY KEY,
+    data_path  TEXT NOT NULL,
+    last_fetch REAL NOT NULL,
+    row_count  INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_last_fetch ON users (last_fetch);
+CREATE TABLE IF NOT EXISTS charts (
+    path       TEXT PRIMARY KEY,
+    username   TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS charts_username ON charts (username);
+"""
+
+
+class Registry:
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # One shared connection; the lock serialises use across threads
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the worker's writes
+        self._conn.executescript(SCHEMA)
+
+    def record_user(self, username, data_path, row_count, size_bytes, fetched_at=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO users (username, data_path, last_fetch, row_count, size_bytes) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (username) DO UPDATE SET "
+                "data_path = excluded.data_path, last_fetch = excluded.last_fetch, "
+                "row_count = excluded.row_count, size_bytes = excluded.size_bytes",
+                (username, data_path, fetched_at or time.time(), int(row_count), int(size_bytes)),
+            )
+
+    def record_chart(self, username, kind, path, size_bytes):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?)",
+                               (path, username, kind, int(size_bytes)))
+
+    def forget_charts(self, paths):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM charts WHERE path = ?", [(p,) for p in paths])
+
+    def list_users(self):
+        """Usernames, most recently fetched first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT username FROM users ORDER BY last_fetch DESC")
+            return [row["username"] for row in rows]
+
+    def users(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT u.*, COUNT(c.path) AS charts, COALESCE(SUM(c.size_bytes), 0) AS chart_bytes "
+                "FROM users u LEFT JOIN charts c ON c.username = u.username "
+                "GROUP BY u.username ORDER BY u.last_fetch DESC")
+            return [dict(row) for row in rows]
+
+    def remove_user(self, username):
+        """
+        Drop a user and their charts from the index in one transaction.
+        Returns the chart paths that were registered, so the caller can
+        delete the files.
+        """
+        with self._lock, self._conn:
+            charts = [row["path"] for row in
+                      self._conn.execute("SELECT path FROM charts WHERE username = ?", (username,))]
+            self._conn.execute("DELETE FROM charts WHERE username = ?", (username,))
+            self._conn.execute("DELETE FROM users WHERE username = ?", (username,))
+        return charts
+
+    def sync(self, storage):
+        """Reconcile with the data directory: add unindexed files, drop vanished ones."""
+        on_disk = set(storage.list_users())
+        indexed = set(self.list_users())
+        for username in on_disk - indexed:
+            st = os.stat(storage.path(username))
+            rows = storage.row_count(username)
+            self.record_user(username, storage.path(username), rows, st.st_size, st.st_mtime)
+        for username in indexed - on_disk:
+            self.remove_user(username)
+
+    def over_quota(self, max_age_hours=DATA_MAX_AGE_HOURS, max_users=MAX_USERS,
+                   quota_mb=DATA_QUOTA_MB, now=None):
+        """
+        Users the retention policy wants gone: anything not fetched within
+        max_age_hours, then the least recently fetched until the rest fit in
+        max_users and quota_mb (data plus charts).
+        """
+        now = now or time.time()
+        users = self.users()  # newest first
+        doomed = []
+        if max_age_hours:
+            cutoff = now - max_age_hours * 3600
+            doomed = [u["username"] for u in users if u["last_fetch"] < cutoff]
+            users = [u for u in users if u["last_fetch"] >= cutoff]
+        total = sum(u["size_bytes"] + u["chart_bytes"] for u in users)
+        while users and ((max_users and len(users) > max_users)
+                         or (quota_mb and total > quota_mb * 1024 * 1024)):
+            oldest = users.pop()
+            total -= oldest["size_bytes"] + oldest["chart_bytes"]
+            doomed.append(oldest["username"])
+        return doomed
+
+
+def start_janitor(registry, delete, interval=JANITOR_INTERVAL):
+    """Background thread that calls delete(username) for every user over quota."""
+    def run():
+        while True:
+            try:
+                for username in registry.over_quota():
+                    print(f"Janitor: removing @{username}")
+                    delete(username)
+            except Exception as e:
+                print(f"Janitor pass failed: {e!r}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="janitor", daemon=True)
+    thread.start()
+    return thread
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry()
+        return _registry
@@ -0,0 +1,175 @@
+"""
+Pre-aggregated engagement rollups.
+
+Per user, one row per (calendar date, hour) with the tweet count and the
+sums of Replies, Retweets, Likes and Engagement, kept up to date at ingest
+and saved as data/<user>.rollups.json. The day x hour cube behind the
+heatmap, best-time answers and engagement-over-time series are all sums
+over this table, which stays small however long the history gets
+(at most 24 rows per day). Rollups add together, so windows and accounts
+merge by summing.
+"""
+import pandas as pd
+
+from memory import CHUNK_ROWS
+
+METRICS = ["Replies", "Retweets", "Likes", "Engagement"]
+COLUMNS = ["count"] + METRICS
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Columns needed to (re)build rollups from stored tweets
+ROLLUP_COLUMNS = ["Datetime"] + METRICS
+
+
+def _empty():
+    index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), pd.Index([], dtype="int64")],
+                                      names=["Date", "Hour"])
+    return pd.DataFrame(0, index=index, columns=COLUMNS, dtype="int64")
+
+
+class Rollups:
+    def __init__(self, table=None, source=None):
+        self.table = _empty() if table is None else table
+        self.source = source  # data file version the rollups match
+
+    @staticmethod
+    def _aggregate(df):
+        df = df[df["Datetime"].notna()]
+        keys = [df["Datetime"].dt.normalize().rename("Date"),
+                df["Datetime"].dt.hour.astype("int64").rename("Hour")]
+        grouped = df[METRICS].astype("int64").groupby(keys)
+        table = grouped.sum()
+        table.insert(0, "count", grouped.size())
+        return table
+
+    def add(self, df, sign=1):
+        """Fold tweets in; sign=-1 takes back tweets whose counts are being replaced."""
+        if len(df):
+            self.table = self._combine(self.table, sign * self._aggregate(df))
+        return self
+
+    def merge(self, other):
+        self.table = self._combine(self.table, other.table)
+        return self
+
+    @staticmethod
+    def _combine(a, b):
+        table = pd.concat([a, b]).groupby(level=["Date", "Hour"]).sum()
+        return table[table["count"] != 0]
+
+    @classmethod
+    def from_tweets(cls, df):
+        return cls().add(df)
+
+    def window(self, start=None, end=None):
+        """Rollups for tweets posted on dates start..end (inclusive)."""
+        dates = self.table.index.get_level_values("Date")
+        mask = pd.Series(True, index=self.table.index)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start).normalize()
+        if end is not None:
+            mask &= dates <= pd.Timestamp(end).normalize()
+        return Rollups(self.table[mask.values])
+
+    def _weekdays(self):
+        # Day numbers rather than day_name(): grouping on ints is much cheaper
+        return self.table.index.get_level_values("Date").dayofweek
+
+    def by_slot(self, slot):
+        """Sums per "DayOfWeek" or "Hour", plus mean Engagement, only for slots with tweets."""
+        if slot == "DayOfWeek":
+            sums = self.table.groupby(self._weekdays()).sum()
+            sums.index = [DAYS[d] for d in sums.index]
+        else:
+            sums = self.table.groupby(self.table.index.get_level_values("Hour")).sum()
+        sums.index.name = slot
+        sums["mean"] = sums["Engagement"] / sums["count"]
+        return sums
+
+    def cube(self, metric="Engagement"):
+        """Mean `metric` per tweet, days x hours, like the old pivot_table over raw tweets."""
+        keys = [self._weekdays().rename("DayOfWeek"), self.table.index.get_level_values("Hour")]
+        sums = self.table[["count", metric]].groupby(keys).sum()
+        cube = (sums[metric] / sums["count"]).unstack("Hour", fill_value=0)
+        cube.index = pd.Index([DAYS[d] for d in cube.index], name="DayOfWeek")
+        return cube
+
+    def best_time(self):
+        """(best day, best hour) by mean engagement, or (None, None) without data."""
+        if self.table.empty:
+            return None, None
+        return self.by_slot("DayOfWeek")["mean"].idxmax(), int(self.by_slot("Hour")["mean"].idxmax())
+
+    def series(self, freq="D"):
+        """Sums per period ("D", "W", "MS", ...) with mean engagement per tweet."""
+        daily = self.table.groupby(level="Date").sum()
+        if daily.empty:
+            return daily.assign(mean=pd.Series(dtype="float64"))
+        series = daily.resample(freq).sum()
+        series["mean"] = (series["Engagement"] / series["count"]).fillna(0)
+        return series
+
+    def to_dict(self):
+        table = self.table.reset_index()
+        return {"source": self.source,
+                "dates": table["Date"].dt.strftime("%Y-%m-%d").tolist(),
+                **{col: table[col].astype(int).tolist() for col in ["Hour"] + COLUMNS}}
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get("dates"):
+            return cls(source=data.get("source"))
+        table = pd.DataFrame({col: data[col] for col in ["Hour"] + COLUMNS}, dtype="int64")
+        table.insert(0, "Date", pd.to_datetime(data["dates"]))
+        return cls(table.set_index(["Date", "Hour"]), data.get("source"))
+
+
+def merge_rollups(rollups):
+    merged = Rollups()
+    for r in rollups:
+        merged.merge(r)
+    return merged
+
+
+def save_rollups(storage, username, rollups):
+    """Save `rollups` as matching the user's current data file."""
+    rollups.source = storage.version(username)
+    storage.save_sidecar(username, "rollups", rollups.to_dict())
+    return rollups
+
+
+def rebuild_rollups(storage, username):
+    rollups = Rollups()
+    for chunk in storage.iter_chunks(username, ROLLUP_COLUMNS, CHUNK_ROWS):
+        rollups.add(chunk)
+    return save_rollups(storage, username, rollups)
+
+
+def update_rollups(storage, username, added, removed=None, previous=None):
+    """
+    Fold an ingest into the user's rollups: `added` tweets in, `removed`
+    (older copies of tweets whose counts were refreshed) out. `previous` is
+    the data file version before the ingest, None when it wrote a new file;
+    if the saved rollups don't match it they are rebuilt from the data.
+    """
+    saved = storage.load_sidecar(username, "rollups")
+    if previous is None:
+        rollups = Rollups()
+    elif saved is not None and tuple(saved.get("source") or ()) == tuple(previous):
+        rollups = Rollups.from_dict(saved)
+    else:
+        return rebuild_rollups(storage, username)
+    rollups.add(added)
+    if removed is not None:
+        rollups.add(removed, sign=-1)
+    return save_rollups(storage, username, rollups)
+
+
+def get_rollups(storage, username):
+    """The user's rollups, rebuilt first if missing or stale. None without data."""
+    source = storage.version(username)
+    if source is None:
+        return None
+    saved = storage.load_sidecar(username, "rollups")
+    if saved is None or tuple(saved.get("source") or ()) != tuple(source):
+        return rebuild_rollups(storage, username)
+    return Rollups.from_dict(saved)
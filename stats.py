@@ -0,0 +1,187 @@
+"""
+Dashboard summary stats.
+
+Summaries are computed once when a user's tweets are ingested, saved next to
+the data file and served from an in-memory LRU cache keyed on the data file
+version, so page views don't touch pandas.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from memory import CHUNK_ROWS
+from rollups import Rollups, get_rollups
+
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", 256))
+
+# Columns compute_summary reads; the list columns are skipped
+SUMMARY_COLUMNS = ['Datetime', 'Date', 'Tweet', 'Replies', 'Retweets', 'Likes', 'Engagement',
+                   'WordCount', 'HasHashtags', 'HasMentions', 'HasLinks', 'HasMedia']
+FLAG_COLUMNS = ['HasHashtags', 'HasMentions', 'HasLinks', 'HasMedia']
+# Columns refresh_summary streams for its totals; tweet text is only read for the recent list
+TOTAL_COLUMNS = ['Engagement', 'WordCount'] + FLAG_COLUMNS
+RECENT_COLUMNS = ['Datetime', 'Date', 'Tweet', 'Replies', 'Retweets', 'Likes', 'Engagement']
+RECENT_TWEETS = 10
+
+
+def _date_range(rollups):
+    dates = rollups.table.index.get_level_values('Date')
+    if dates.empty:
+        return 'N/A'
+    return f"{dates.min().strftime('%Y-%m-%d')} to {dates.max().strftime('%Y-%m-%d')}"
+
+
+def _pct(count, total):
+    return round(count / total * 100, 1) if total else 0.0
+
+
+def _pattern_table(stats):
+    return {key: {'mean': round(float(row['mean']), 2), 'count': int(row['count'])}
+            for key, row in stats.iterrows()}
+
+
+def _totals(df):
+    """Counts and sums behind the engagement and content sections; they add up across chunks."""
+    return {'tweets': len(df), 'engagement': int(df['Engagement'].sum()),
+            'peak': int(df['Engagement'].max()) if len(df) else 0,
+            'words': int(df['WordCount'].sum()),
+            **{col: int(df[col].sum()) for col in FLAG_COLUMNS}}
+
+
+def _add_totals(a, b):
+    return {key: max(a[key], b[key]) if key == 'peak' else a[key] + b[key] for key in a}
+
+
+def _build_summary(totals, rollups, recent, source):
+    tweets = totals['tweets']
+    day_stats = rollups.by_slot('DayOfWeek')
+    hour_stats = rollups.by_slot('Hour')
+    best_day = day_stats['mean'].idxmax() if not day_stats.empty else 'N/A'
+    best_hour = int(hour_stats['mean'].idxmax()) if not hour_stats.empty else 0
+
+    recent_tweets = [
+        {**row, 'Datetime': None if pd.isna(row['Datetime']) else row['Datetime'].isoformat(),
+         'Replies': int(row['Replies']), 'Retweets': int(row['Retweets']),
+         'Likes': int(row['Likes']), 'Engagement': int(row['Engagement'])}
+        for row in recent[RECENT_COLUMNS].head(RECENT_TWEETS).to_dict('records')
+    ]
+
+    return {
+        'source': source,
+        'tweet_activity': {
+            'total_tweets': tweets,
+            'date_range': _date_range(rollups),
+        },
+        'engagement': {
+            'total': totals['engagement'],
+            'average': round(totals['engagement'] / tweets, 2) if tweets else 0.0,
+            'peak': totals['peak'],
+        },
+        'content_analysis': {
+            'hashtags_percentage': _pct(totals['HasHashtags'], tweets),
+            'mentions_percentage': _pct(totals['HasMentions'], tweets),
+            'links_percentage': _pct(totals['HasLinks'], tweets),
+            'media_percentage': _pct(totals['HasMedia'], tweets),
+            'avg_word_count': round(totals['words'] / tweets, 1) if tweets else 0.0,
+        },
+        'posting_patterns': {
+            'optimal_time': f"{best_day} at {best_hour:02d}:00" if best_day != 'N/A' else 'N/A',
+            'best_day': best_day,
+            'best_hour': best_hour,
+            'days': _pattern_table(day_stats),
+            'hours': {f"{int(h):02d}:00": row for h, row in _pattern_table(hour_stats).items()},
+        },
+        'recent_tweets': recent_tweets,
+    }
+
+
+def compute_summary(df, source=None, rollups=None):
+    """
+    Everything user_dashboard and compare_users show for one user, as plain
+    JSON-safe types. `source` records the data file version it was built from.
+    Posting patterns and the date range come from the user's rollups (built
+    from df if not given).
+    """
+    rollups = rollups if rollups is not None else Rollups.from_tweets(df)
+    return _build_summary(_totals(df), rollups, df, source)
+
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters."""
+
+    def __init__(self, maxsize=SUMMARY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, username):
+        """Drop every cached version for a user."""
+        with self._lock:
+            for key in [k for k in self._data if k[0] == username]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'size': len(self._data), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / total, 3) if total else 0.0}
+
+
+def refresh_summary(storage, username):
+    """
+    Compute and persist the summary for the user's current data file, like
+    compute_summary but without loading the history: totals are summed a
+    chunk at a time over the narrow columns, and only the first
+    RECENT_TWEETS rows are read with their text.
+    """
+    source = storage.version(username)
+    totals = None
+    for chunk in storage.iter_chunks(username, TOTAL_COLUMNS, CHUNK_ROWS):
+        totals = _totals(chunk) if totals is None else _add_totals(totals, _totals(chunk))
+    chunks = storage.iter_chunks(username, RECENT_COLUMNS, RECENT_TWEETS)
+    recent = next(chunks, pd.DataFrame(columns=RECENT_COLUMNS))
+    chunks.close()
+    summary = _build_summary(totals or _totals(pd.DataFrame(columns=TOTAL_COLUMNS)),
+                             get_rollups(storage, username), recent, source)
+    storage.save_summary(username, summary)
+    return summary
+
+
+def get_summary(storage, username, cache):
+    """
+    Summary for the user's current data, or None if there is no data.
+    Keyed on (username, mtime, size) so a re-analysis misses automatically.
+    """
+    source = storage.version(username)
+    if source is None:
+        return None
+    key = (username, *source)
+    summary = cache.get(key)
+    if summary is None:
+        summary = storage.load_summary(username)
+        if summary is None or tuple(summary.get('source') or ()) != tuple(source):
+            summary = refresh_summary(storage, username)
+        cache.invalidate(username)
+        cache.put(key, summary)
+    return summary
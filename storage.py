@@ -0,0 +1,358 @@
+"""
+Per-user tweet storage.
+
+Feather (Arrow IPC) keeps real datetime/int/bool/list dtypes, supports
+column projection and is read memory-mapped. It is written uncompressed
+by default: compressed buffers have to be decompressed onto the heap on
+every read, which undoes the memory map. CSV is kept as a fallback for
+hosts without pyarrow.
+
+Usage:
+    python storage.py migrate    # convert existing data/*.csv files
+"""
+import os
+import sys
+import ast
+import json
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+STORAGE_FORMAT = os.environ.get("STORAGE_FORMAT") or ("feather" if pa is not None else "csv")
+# "lz4" or "zstd" trade smaller files for reads that no longer share the page cache
+FEATHER_COMPRESSION = os.environ.get("FEATHER_COMPRESSION", "uncompressed")
+
+LIST_COLUMNS = ["Hashtags", "Mentions", "Links"]
+# Parsed as written: a float64 TweetId column (any missing id) would round 19-digit ids
+CSV_DTYPES = {"TweetId": "Int64"}
+# Derived per-user JSON files removed along with the data
+SIDECARS = ["summary", "terms", "rollups"]
+
+
+def _atomic_write(path, write):
+    """Write through a temp file in the same directory so readers never see partial data."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class _PageWriter:
+    """Writes a user's data a page at a time into `tmp`; see CsvStorage.writer."""
+
+    def __init__(self, tmp):
+        self.tmp = tmp
+        self.rows = 0
+
+    def write(self, df):
+        if len(df):
+            self._write(df)
+            self.rows += len(df)
+
+    def close(self):
+        pass
+
+
+class _CsvPageWriter(_PageWriter):
+    def _write(self, df):
+        df.to_csv(self.tmp, mode="a" if self.rows else "w", header=not self.rows, index=False)
+
+
+class _FeatherPageWriter(_PageWriter):
+    # Feather v2 is the Arrow IPC file format, so pages can be streamed in
+    # as record batches instead of rewriting the file for each one
+    def __init__(self, tmp):
+        super().__init__(tmp)
+        self._writer = None
+
+    def _write(self, df):
+        table = _to_arrow(df)
+        if self._writer is None:
+            compression = None if FEATHER_COMPRESSION == "uncompressed" else FEATHER_COMPRESSION
+            self.schema = table.schema
+            self._writer = pa.ipc.new_file(self.tmp, self.schema,
+                                           options=pa.ipc.IpcWriteOptions(compression=compression))
+        else:
+            table = table.select(self.schema.names).cast(self.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class CsvStorage:
+    ext = ".csv"
+    _page_writer = _CsvPageWriter
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+
+    def path(self, username):
+        return os.path.join(self.data_dir, f"{username}{self.ext}")
+
+    def exists(self, username):
+        return os.path.exists(self.path(username))
+
+    def list_users(self):
+        if not os.path.isdir(self.data_dir):
+            return []
+        return [f[:-len(self.ext)] for f in os.listdir(self.data_dir) if f.endswith(self.ext)]
+
+    def version(self, username):
+        """(mtime_ns, size) of the user's data file, or None if there is none."""
+        try:
+            st = os.stat(self.path(username))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def sidecar_path(self, username, kind):
+        """JSON kept next to the data file: "summary", "terms", ..."""
+        return os.path.join(self.data_dir, f"{username}.{kind}.json")
+
+    def save_sidecar(self, username, kind, obj):
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(obj, f)
+        _atomic_write(self.sidecar_path(username, kind), write)
+
+    def load_sidecar(self, username, kind):
+        try:
+            with open(self.sidecar_path(username, kind), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def summary_path(self, username):
+        return self.sidecar_path(username, "summary")
+
+    def save_summary(self, username, summary):
+        self.save_sidecar(username, "summary", summary)
+
+    def load_summary(self, username):
+        return self.load_sidecar(username, "summary")
+
+    def delete(self, username):
+        paths = [self.path(username)] + [self.sidecar_path(username, kind) for kind in SIDECARS]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self, username, df):
+        _atomic_write(self.path(username), lambda tmp: df.to_csv(tmp, index=False))
+        return self.path(username)
+
+    @contextmanager
+    def writer(self, username):
+        """
+        Write the user's data a page at a time with `.write(df)`. Pages go to
+        a temp file that replaces the data file once, when the block exits
+        without error, so each page is written once and readers never see a
+        partial file. The data file is left alone if no rows were written.
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.data_dir, suffix=".tmp")
+        os.close(fd)
+        out = self._page_writer(tmp)
+        try:
+            try:
+                yield out
+            finally:
+                out.close()
+            if out.rows:
+                os.replace(tmp, self.path(username))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load_many(self, usernames, columns=None, workers=8):
+        """Several users' data as one frame plus each user's row count."""
+        def read(username):
+            try:
+                return self.load(username, columns)
+            except FileNotFoundError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(usernames) or 1))) as pool:
+            frames = list(pool.map(read, usernames))
+        found = [(u, f) for u, f in zip(usernames, frames) if f is not None]
+        if not found:
+            return pd.DataFrame(columns=columns), []
+        return (pd.concat([f for _, f in found], ignore_index=True),
+                [(u, len(f)) for u, f in found])
+
+    def columns(self, username):
+        """Column names stored for the user."""
+        return list(pd.read_csv(self.path(username), nrows=0).columns)
+
+    def row_count(self, username):
+        return sum(len(chunk) for chunk in pd.read_csv(self.path(username), usecols=[0],
+                                                         chunksize=50000))
+
+    def iter_chunks(self, username, columns=None, rows=50000):
+        """The user's data as frames of at most `rows` rows, so big histories aren't loaded whole."""
+        for chunk in pd.read_csv(self.path(username), usecols=columns, dtype=CSV_DTYPES,
+                                 chunksize=rows):
+            yield self._restore(chunk)
+
+    def load(self, username, columns=None):
+        return self._restore(pd.read_csv(self.path(username), usecols=columns, dtype=CSV_DTYPES))
+
+    @staticmethod
+    def _restore(df):
+        # CSV loses types: restore datetimes and the stringified lists
+        if "Datetime" in df:
+            df["Datetime"] = pd.to_datetime(df["Datetime"], errors="coerce")
+        for col in LIST_COLUMNS:
+            if col in df:
+                df[col] = df[col].map(lambda v: ast.literal_eval(v) if isinstance(v, str) else [])
+        return df
+
+
+def _pandas_type(arrow_type):
+    # Keep list columns as Arrow lists instead of per-row numpy arrays
+    if pa.types.is_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    # int64 (TweetId) stays nullable: with a null in it, pandas would fall
+    # back to float64 and round 19-digit ids
+    if pa.types.is_int64(arrow_type):
+        return pd.Int64Dtype()
+    return None
+
+
+def _to_arrow(df):
+    # Drop the pandas metadata: frames read back from Feather carry ArrowDtype
+    # list columns whose dtype names pandas can't parse on the next load
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+    # Categoricals (DayOfWeek) are stored as plain strings so appends line up
+    # with existing files
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+        elif pa.types.is_list(field.type) and pa.types.is_null(field.type.value_type):
+            # A page without any hashtags still has the type of one with some
+            table = table.set_column(i, field.name, table.column(i).cast(pa.list_(pa.string())))
+    return table
+
+
+class FeatherStorage(CsvStorage):
+    ext = ".feather"
+    _page_writer = _FeatherPageWriter
+
+    def save(self, username, df):
+        table = _to_arrow(df)
+        _atomic_write(self.path(username),
+                      lambda tmp: feather.write_feather(table, tmp, compression=FEATHER_COMPRESSION))
+        return self.path(username)
+
+    def load_table(self, username, columns=None):
+        return feather.read_table(self.path(username), columns=columns, memory_map=True)
+
+    def load(self, username, columns=None):
+        return self.load_table(username, columns).to_pandas(types_mapper=_pandas_type)
+
+    @contextmanager
+    def _reader(self, username):
+        # The file footer holds the schema and batch layout, so opening it reads no data
+        with pa.memory_map(self.path(username)) as source:
+            yield pa.ipc.open_file(source)
+
+    def columns(self, username):
+        with self._reader(username) as reader:
+            return reader.schema.names
+
+    def row_count(self, username):
+        with self._reader(username) as reader:
+            if hasattr(reader, "count_rows"):
+                return reader.count_rows()
+            # Older pyarrow: one batch at a time, freed as soon as it is counted
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+    def iter_chunks(self, username, columns=None, rows=50000):
+        # One record batch is read at a time, so even compressed files (which
+        # are decompressed on read) are never held whole
+        with self._reader(username) as reader:
+            batches, count = [], 0
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                while batch.num_rows:
+                    part = batch.slice(0, rows - count)
+                    batches.append(part)
+                    count += part.num_rows
+                    batch = batch.slice(part.num_rows)
+                    if count == rows:
+                        yield pa.Table.from_batches(batches).to_pandas(types_mapper=_pandas_type)
+                        batches, count = [], 0
+            if batches:
+                yield pa.Table.from_batches(batches).to_pandas(types_mapper=_pandas_type)
+
+    def load_many(self, usernames, columns=None, workers=8):
+        """
+        Several users' data as one frame plus each user's row count. The
+        Arrow tables are read in parallel and converted to pandas once.
+        """
+        def read(username):
+            try:
+                return self.load_table(username, columns)
+            except FileNotFoundError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(usernames) or 1))) as pool:
+            tables = list(pool.map(read, usernames))
+        found = [(u, t) for u, t in zip(usernames, tables) if t is not None]
+        if not found:
+            return pd.DataFrame(columns=columns), []
+        table = pa.concat_tables([t for _, t in found], promote_options="permissive")
+        return table.to_pandas(types_mapper=_pandas_type), [(u, t.num_rows) for u, t in found]
+
+
+def get_storage(fmt=None, data_dir=DATA_DIR):
+    fmt = fmt or STORAGE_FORMAT
+    if fmt == "feather":
+        if pa is None:
+            raise RuntimeError("STORAGE_FORMAT=feather needs pyarrow installed")
+        return FeatherStorage(data_dir)
+    return CsvStorage(data_dir)
+
+
+def migrate_csv_files(storage=None):
+    """One-time conversion of legacy data/<user>.csv files into the configured format."""
+    storage = storage or get_storage()
+    if isinstance(storage, FeatherStorage):
+        legacy = CsvStorage(storage.data_dir)
+        for username in legacy.list_users():
+            try:
+                storage.save(username, legacy.load(username))
+                # Only the CSV: the summary/terms/rollups sidecars are shared
+                # by both formats and rebuild themselves if stale
+                os.remove(legacy.path(username))
+                print(f"Migrated {legacy.path(username)} -> {storage.path(username)}")
+            except Exception as e:
+                print(f"Could not migrate @{username}: {e!r}")
+    return storage
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        migrate_csv_files()
+    else:
+        print(__doc__)
@@ -0,0 +1,186 @@
+"""
+Per-user term-frequency index.
+
+Counts of words, hashtags, mentions and link domains, updated with each
+batch of newly ingested tweets and saved next to the user's data as
+data/<user>.terms.json. Word clouds render straight from the word counts
+and top-N queries read the index instead of rescanning tweet text.
+
+Each kind keeps at most TERMS_MAX_PER_KIND terms; rarer ones are pruned
+after every update, so memory stays bounded and counts near the cut-off
+are approximate.
+"""
+import os
+import importlib.util
+from collections import Counter
+
+from memory import CHUNK_ROWS
+
+TERMS_MAX_PER_KIND = int(os.environ.get("TERMS_MAX_PER_KIND", 5000))
+TERM_KINDS = ("words", "hashtags", "mentions", "domains")
+# Columns needed to (re)build an index from stored tweets
+TERM_COLUMNS = ["Tweet", "Hashtags", "Mentions", "Links"]
+
+_stopwords = None
+
+
+def stopwords():
+    """wordcloud's stop word list, read from its data file without importing the package."""
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = set()
+        spec = importlib.util.find_spec("wordcloud")
+        if spec is not None and spec.submodule_search_locations:
+            path = os.path.join(spec.submodule_search_locations[0], "stopwords")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    _stopwords = {line.strip() for line in f if line.strip()}
+    return _stopwords
+
+
+def _value_counts(values):
+    values = values.dropna()
+    return dict(values.value_counts()) if len(values) else {}
+
+
+def _has_lists(df, col):
+    # Data saved without the list columns (KEEP_LISTS=0), or merged from
+    # such data, lacks them for some tweets: re-derive them from the text
+    return col in df and df[col].notna().all()
+
+
+def _count_chunk(df, kinds=TERM_KINDS):
+    counts = {}
+    if "words" in kinds:
+        # Same tokens WordCloud.generate would pick, minus links
+        text = df["Tweet"].str.replace(r"https?://\S+", " ", regex=True).str.lower()
+        words = text.str.findall(r"\w[\w']+").explode().dropna()
+        words = words.str.replace(r"'s$", "", regex=True)
+        words = words[~words.isin(stopwords()) & ~words.str.isdigit()]
+        counts["words"] = _value_counts(words)
+
+    for kind, col in (("hashtags", "Hashtags"), ("mentions", "Mentions")):
+        if kind not in kinds:
+            continue
+        if _has_lists(df, col):
+            counts[kind] = _value_counts(df[col].explode())
+        else:
+            pattern = r"#\w+" if kind == "hashtags" else r"@\w+"
+            counts[kind] = _value_counts(df["Tweet"].str.findall(pattern).explode())
+
+    if "domains" in kinds:
+        if _has_lists(df, "Links"):
+            links = df["Links"].explode()
+        else:
+            links = df["Tweet"].str.findall(r"https?://\S+").explode()
+        domains = links.dropna().astype(str).str.extract(r"^https?://(?:www\.)?([^/?#\s]+)", expand=False)
+        counts["domains"] = _value_counts(domains.str.lower())
+    return counts
+
+
+class TermIndex:
+    def __init__(self, counts=None, tweets=0, source=None):
+        self.counts = {kind: Counter((counts or {}).get(kind, {})) for kind in TERM_KINDS}
+        self.tweets = tweets
+        self.source = source  # data file version the index matches
+
+    def add(self, df, max_terms=TERMS_MAX_PER_KIND, kinds=TERM_KINDS, sign=1):
+        """
+        Count the terms of newly ingested tweets, in chunks to bound memory;
+        sign=-1 takes back tweets the data file no longer holds.
+        """
+        for start in range(0, len(df), CHUNK_ROWS):
+            for kind, counts in _count_chunk(df.iloc[start:start + CHUNK_ROWS], kinds).items():
+                self.counts[kind].update({term: sign * int(n) for term, n in counts.items()})
+        self.tweets += sign * len(df)
+        if sign < 0:
+            # Terms counted down to nothing (or below, if pruned earlier) go
+            self.counts = {kind: +counts for kind, counts in self.counts.items()}
+        self.prune(max_terms)
+        return self
+
+    def merge(self, other, max_terms=TERMS_MAX_PER_KIND):
+        for kind in TERM_KINDS:
+            self.counts[kind].update(other.counts[kind])
+        self.tweets += other.tweets
+        self.prune(max_terms)
+        return self
+
+    def prune(self, max_terms=TERMS_MAX_PER_KIND):
+        for kind, counts in self.counts.items():
+            if max_terms and len(counts) > max_terms:
+                self.counts[kind] = Counter(dict(counts.most_common(max_terms)))
+
+    def top(self, kind, n=10):
+        """[(term, count)] most frequent first."""
+        return self.counts[kind].most_common(n)
+
+    def frequencies(self, kind="words", n=200):
+        return dict(self.top(kind, n))
+
+    def to_dict(self):
+        return {"source": self.source, "tweets": self.tweets,
+                "counts": {kind: dict(c.most_common()) for kind, c in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("counts"), data.get("tweets", 0), data.get("source"))
+
+    @classmethod
+    def from_tweets(cls, df, max_terms=TERMS_MAX_PER_KIND, kinds=TERM_KINDS):
+        return cls().add(df, max_terms, kinds)
+
+
+def merge_indexes(indexes, max_terms=TERMS_MAX_PER_KIND):
+    """One index covering several users."""
+    merged = TermIndex()
+    for index in indexes:
+        merged.merge(index, max_terms)
+    return merged
+
+
+def save_terms(storage, username, index):
+    """Save `index` as matching the user's current data file."""
+    index.source = storage.version(username)
+    storage.save_sidecar(username, "terms", index.to_dict())
+    return index
+
+
+def rebuild_terms(storage, username):
+    stored = storage.columns(username)
+    index = TermIndex()
+    for chunk in storage.iter_chunks(username, [c for c in TERM_COLUMNS if c in stored], CHUNK_ROWS):
+        index.add(chunk)
+    return save_terms(storage, username, index)
+
+
+def update_terms(storage, username, new_tweets, previous=None, removed=None):
+    """
+    Add freshly ingested tweets to the user's index and take `removed` ones
+    (stored rows the ingest replaced) out. `previous` is the data
+    file version before this ingest, None when the ingest wrote a new file.
+    If the saved index doesn't match `previous`, it is rebuilt from the
+    stored tweets instead.
+    """
+    saved = storage.load_sidecar(username, "terms")
+    if previous is None:
+        index = TermIndex()
+    elif saved is not None and tuple(saved.get("source") or ()) == tuple(previous):
+        index = TermIndex.from_dict(saved)
+    else:
+        return rebuild_terms(storage, username)
+    index.add(new_tweets)
+    if removed is not None:
+        index.add(removed, sign=-1)
+    return save_terms(storage, username, index)
+
+
+def get_terms(storage, username):
+    """The user's index, rebuilt first if it is missing or stale. None without data."""
+    source = storage.version(username)
+    if source is None:
+        return None
+    saved = storage.load_sidecar(username, "terms")
+    if saved is None or tuple(saved.get("source") or ()) != tuple(source):
+        return rebuild_terms(storage, username)
+    return TermIndex.from_dict(saved)
@@ -0,0 +1,14 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MPLBACKEND", "Agg")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+
+def fixture_html(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
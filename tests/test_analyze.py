@@ -0,0 +1,176 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import analytics
+import instances
+from benchmark import TimelineServer, make_timeline_html
+from page_cache import PageCache
+from registry import Registry
+from rollups import Rollups, get_rollups, rebuild_rollups, save_rollups
+from storage import get_storage
+from terms import TermIndex, get_terms, rebuild_terms, save_terms
+
+
+@pytest.fixture
+def server():
+    with TimelineServer(pages=3, page_size=5) as server:
+        yield server
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return Registry(str(tmp_path / "registry.db"))
+
+
+@pytest.fixture(params=["feather", "csv"])
+def storage(request, server, registry, tmp_path, monkeypatch):
+    """analytics wired to a throwaway data dir, registry, page cache and the local server."""
+    storage = get_storage(request.param, str(tmp_path))
+    pool = instances.InstancePool([server.url], rate=1000, burst=1000)
+    monkeypatch.setattr(analytics, "user_storage", storage)
+    monkeypatch.setattr(analytics, "get_registry", lambda: registry)
+    monkeypatch.setattr(analytics, "get_page_cache", lambda: PageCache(str(tmp_path / "pages")))
+    monkeypatch.setattr(analytics, "get_instance_pool", lambda: pool)
+    monkeypatch.setattr(analytics, "FETCH_BACKEND", "http")
+    return storage
+
+
+def test_full_scrape_streams_pages_to_storage(storage, registry):
+    assert analytics.analyze_user("someone", max_tweets=100, incremental=False) == 15
+    df = storage.load("someone")
+    assert len(df) == 15 and df["TweetId"].is_unique
+    assert [u["username"] for u in registry.users()] == ["someone"]
+    # the per-page updates add up to what a rebuild from the file gives
+    assert get_terms(storage, "someone").counts == rebuild_terms(storage, "someone").counts
+    pd.testing.assert_frame_equal(get_rollups(storage, "someone").table,
+                                  rebuild_rollups(storage, "someone").table)
+    assert storage.load_summary("someone")["source"] == list(storage.version("someone"))
+
+
+def test_incremental_run_keeps_stored_tweets(storage, server):
+    analytics.analyze_user("someone", max_tweets=100, incremental=False)
+    requests = server.requests
+    assert analytics.analyze_user("someone", max_tweets=100, refresh=True) == 15
+    assert server.requests > requests
+    assert len(storage.load("someone")) == 15
+    assert get_terms(storage, "someone").tweets == 15
+
+
+def test_no_data_returns_none(storage, monkeypatch):
+    with TimelineServer(pages=0) as empty:
+        pool = instances.InstancePool([empty.url], rate=1000, burst=1000)
+        monkeypatch.setattr(analytics, "get_instance_pool", lambda: pool)
+        assert analytics.analyze_user("nobody", incremental=False) is None
+    assert not storage.exists("nobody")
+
+
+def test_merge_tweets_prefers_fresh_counts():
+    existing = pd.DataFrame({"TweetId": [3, 2, 1, None], "Likes": [30, 20, 10, 5]})
+    fresh = pd.DataFrame({"TweetId": [4, 3], "Likes": [40, 31]})
+    merged = analytics.merge_tweets(existing.astype({"TweetId": "Int64"}),
+                                    fresh.astype({"TweetId": "Int64"}))
+    assert merged["TweetId"].tolist()[:4] == [4, 3, 2, 1]
+    assert merged["TweetId"].isna().sum() == 1
+    assert merged["Likes"].tolist() == [40, 31, 20, 10, 5]
+
+
+def _tweet(tweet_id, likes=1, date="Jan 5, 2024", text="hello #tag"):
+    return {"TweetId": str(tweet_id), "Date": date, "Tweet": text, "Replies": "0",
+            "Retweets": "0", "Likes": str(likes), "HasMedia": False}
+
+
+def _serve(server, pages):
+    server.pages = [make_timeline_html(page, cursor=i + 1 if i + 1 < len(pages) else None).encode()
+                    for i, page in enumerate(pages)]
+
+
+def test_refresh_boundary():
+    now = datetime(2025, 6, 1, 12, 0)
+    stored = pd.DataFrame({"TweetId": pd.array([30, 20, 10], dtype="Int64"),
+                           "Datetime": pd.to_datetime(["2025-06-01 10:00", "2025-05-01 00:00", "2025-04-01 00:00"])})
+    # 30 is inside the refresh window, so paging goes on until 20
+    assert analytics._refresh_boundary(stored, now) == 20
+    recent = stored.assign(Datetime=pd.Timestamp("2025-06-01 11:00"))
+    assert analytics._refresh_boundary(recent, now) == 10
+    assert analytics._refresh_boundary(stored.assign(TweetId=pd.array([None] * 3, dtype="Int64")), now) is None
+
+
+def test_incremental_run_merges_new_tweets(storage, server):
+    _serve(server, [[_tweet(i) for i in range(100, 95, -1)], [_tweet(i) for i in range(95, 90, -1)]])
+    assert analytics.analyze_user("someone", max_tweets=100, incremental=False) == 10
+
+    # Two new tweets on top, and more likes on the newest stored one
+    _serve(server, [[_tweet(102, text="new #fresh"), _tweet(101), _tweet(100, likes=50), _tweet(99)],
+                    [_tweet(i) for i in range(98, 90, -1)]])
+    requests = server.requests
+    assert analytics.analyze_user("someone", max_tweets=100, refresh=True) == 12
+    assert server.requests == requests + 1  # stopped at the stored tweets
+
+    df = storage.load("someone")
+    assert df["TweetId"].tolist() == list(range(102, 90, -1))
+    assert df.set_index("TweetId").loc[100, "Likes"] == 50
+    index = get_terms(storage, "someone")
+    assert index.tweets == 12 and dict(index.top("hashtags"))["#fresh"] == 1
+    assert index.counts == rebuild_terms(storage, "someone").counts
+    pd.testing.assert_frame_equal(get_rollups(storage, "someone").table,
+                                  rebuild_rollups(storage, "someone").table)
+    assert storage.load_summary("someone")["tweet_activity"]["total_tweets"] == 12
+
+
+def test_incremental_run_is_not_capped_by_max_tweets(storage, server):
+    _serve(server, [[_tweet(i) for i in range(100, 95, -1)]])
+    analytics.analyze_user("someone", max_tweets=100, incremental=False)
+
+    # More new tweets than max_tweets: all of them are fetched, leaving no gap
+    _serve(server, [[_tweet(i) for i in range(j, j - 5, -1)] for j in range(120, 90, -5)])
+    assert analytics.analyze_user("someone", max_tweets=5, refresh=True) == 25
+    assert storage.load("someone")["TweetId"].tolist() == list(range(120, 95, -1))
+
+
+def _assert_indexes_match_rebuild(storage):
+    assert get_terms(storage, "someone").counts == rebuild_terms(storage, "someone").counts
+    assert get_terms(storage, "someone").tweets == storage.row_count("someone")
+    pd.testing.assert_frame_equal(get_rollups(storage, "someone").table,
+                                  rebuild_rollups(storage, "someone").table)
+
+
+def test_repeated_tweet_ids_are_stored_and_counted_once(storage, server):
+    # A pinned tweet at the top that also turns up further down
+    _serve(server, [[_tweet(98), _tweet(100), _tweet(99)], [_tweet(98), _tweet(97)]])
+    assert analytics.analyze_user("someone", max_tweets=100, incremental=False) == 4
+    assert storage.load("someone")["TweetId"].is_unique
+
+    _serve(server, [[_tweet(98), _tweet(101, text="new #fresh"), _tweet(100, likes=50),
+                     _tweet(98), _tweet(99)], [_tweet(97)]])
+    assert analytics.analyze_user("someone", max_tweets=100, refresh=True) == 5
+    assert storage.load("someone")["TweetId"].tolist() == [101, 100, 99, 98, 97]
+    _assert_indexes_match_rebuild(storage)
+    assert storage.load_summary("someone")["tweet_activity"]["total_tweets"] == 5
+
+
+def test_merge_drops_repeated_ids_already_stored(storage, server):
+    # Data written before repeated ids were skipped, indexes counting both copies
+    stored = analytics.process_tweets(pd.DataFrame([_tweet(i) for i in [98, 100, 99, 98, 97]]))
+    storage.save("someone", stored)
+    save_terms(storage, "someone", TermIndex.from_tweets(stored))
+    save_rollups(storage, "someone", Rollups.from_tweets(stored))
+
+    _serve(server, [[_tweet(101), _tweet(100, likes=50), _tweet(99)]])
+    assert analytics.analyze_user("someone", max_tweets=100, refresh=True) == 5
+    assert storage.load("someone")["TweetId"].tolist() == [101, 100, 99, 98, 97]
+    _assert_indexes_match_rebuild(storage)
+
+
+def test_merge_keeps_ids_exact_next_to_a_missing_one(storage, server):
+    stored = analytics.process_tweets(pd.DataFrame(
+        [_tweet(i) for i in [1790000000000000003, 1790000000000000002, None, 1790000000000000001]]))
+    storage.save("someone", stored)
+    loaded = storage.load("someone")["TweetId"]
+    assert loaded.tolist() == [1790000000000000003, 1790000000000000002, pd.NA, 1790000000000000001]
+
+    _serve(server, [[_tweet(1790000000000000004), _tweet(1790000000000000003)]])
+    assert analytics.analyze_user("someone", max_tweets=100, refresh=True) == 5
+    assert storage.load("someone")["TweetId"].dropna().tolist() == [
+        1790000000000000004, 1790000000000000003, 1790000000000000002, 1790000000000000001]
@@ -0,0 +1,106 @@
+import threading
+
+import analytics
+import batch
+from benchmark import make_raw_frame
+from storage import FeatherStorage
+
+
+def _fetched(username, incremental, refresh):
+    return [], None, True  # no new pages for a stored account
+
+
+def test_failed_submit_releases_its_slot(monkeypatch):
+    monkeypatch.setattr(batch, "fetch_account", _fetched)
+
+    def submit(self, fn, *args):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+    monkeypatch.setattr(batch._Renderer, "submit", submit)
+
+    reports = []
+    usernames = [f"user{i}" for i in range(5)]
+    thread = threading.Thread(target=lambda: reports.append(
+        batch.run_batch(usernames, fetch_workers=2, render_workers=1)), daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "run_batch hung waiting for render slots"
+    report = reports[0]
+    assert report["succeeded"] == []
+    assert sorted(report["failed"]) == usernames
+    assert all(error.startswith("render:") for error in report["failed"].values())
+
+
+def test_fetch_errors_are_reported(monkeypatch):
+    def fetch_account(username, incremental, refresh):
+        if username == "broken":
+            raise ValueError("No data found for @broken")
+        return _fetched(username, incremental, refresh)
+    monkeypatch.setattr(batch, "fetch_account", fetch_account)
+    monkeypatch.setattr(batch, "ingest_account", lambda username, fetched: 5)
+    report = batch.run_batch(["ok", "broken", "ok"], fetch_workers=2, render=False)
+    assert report["accounts"] == 2
+    assert report["succeeded"] == ["ok"]
+    assert report["results"]["ok"]["tweets"] == 5
+    assert report["failed"] == {"broken": "fetch: ValueError('No data found for @broken')"}
+
+
+def test_fetch_then_process_in_spawned_workers(tmp_path, monkeypatch, capsys):
+    # Spawned workers import analytics afresh and pick these up
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setenv("STATIC_DIR", str(tmp_path / "static"))
+    monkeypatch.setenv("STORAGE_FORMAT", "feather")
+    (tmp_path / "static").mkdir()
+    sizes = {"alice": 150, "bob": 90, "carol": 60}
+
+    def fetch_account(username, incremental, refresh):
+        raw = make_raw_frame(sizes[username], seed=len(username), with_ids=True)
+        return [raw.iloc[:50].to_dict("records"), raw.iloc[50:].to_dict("records")], None, False
+    monkeypatch.setattr(batch, "fetch_account", fetch_account)
+
+    def not_here(*args, **kwargs):
+        raise AssertionError("process_tweets ran in the fetch threads")
+    monkeypatch.setattr(analytics, "process_tweets", not_here)
+
+    report = batch.run_batch(list(sizes), fetch_workers=2, render_workers=2)
+    assert report["failed"] == {}
+    assert report["succeeded"] == sorted(sizes)
+    storage = FeatherStorage(str(tmp_path / "data"))
+    for username, tweets in sizes.items():
+        result = report["results"][username]
+        assert result["tweets"] == tweets
+        assert result["fetch_s"] >= 0 and result["render_s"] > 0
+        assert storage.row_count(username) == tweets
+        assert storage.load_summary(username)["tweet_activity"]["total_tweets"] == tweets
+        for chart in ("heatmap", "timeline", "wordcloud"):
+            path = tmp_path / "static" / f"{username}_{chart}.png"
+            assert path.read_bytes().startswith(b"\x89PNG")
+    out = capsys.readouterr().out
+    for username, tweets in sizes.items():
+        assert f"Detailed Analysis for @{username}:" in out
+        assert f"Total tweets analyzed: {tweets}" in out
+
+
+class _Abort(BaseException):
+    pass
+
+
+def test_fetchers_stop_when_the_render_loop_dies(monkeypatch):
+    monkeypatch.setattr(batch, "fetch_account", _fetched)
+
+    def submit(self, fn, *args):
+        raise _Abort()
+    monkeypatch.setattr(batch._Renderer, "submit", submit)
+
+    raised = []
+
+    def run():
+        try:
+            batch.run_batch([f"user{i}" for i in range(8)], fetch_workers=2, render_workers=1,
+                            queue_size=1)
+        except _Abort:
+            raised.append(True)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "run_batch hung on fetchers blocked on the full queue"
+    assert raised == [True]
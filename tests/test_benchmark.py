@@ -0,0 +1,34 @@
+import json
+import os
+
+from benchmark import compare_reports
+
+
+def test_compare_reports_flags_regressions():
+    baseline = {"commit": "abc", "results": {"slow": 100.0, "fast": 100.0, "tiny": 0.1, "gone": 5.0}}
+    current = {"results": {"slow": 200.0, "fast": 90.0, "tiny": 0.5, "new": 1.0}}
+    # tiny is 5x slower but only by 0.4 ms, under the noise floor
+    assert compare_reports(baseline, current, threshold=1.5, min_ms=1.0) == ["slow"]
+    assert compare_reports(baseline, current, threshold=1.5, min_ms=0.0) == ["slow", "tiny"]
+
+
+# What run_suite records, by default size; compare_reports skips any name
+# missing from the baseline, so a stale baseline hides regressions
+SUITE_BENCHMARKS = [
+    *(f"{name}/{n}" for name in ("process_tweets", "compute_summary") for n in (1000, 100000, 1000000)),
+    *(f"{name}/{n}" for n in (1000, 100000)
+      for name in ("print_summary", "plot_heatmap", "plot_wordcloud", "terms_build", "terms_top",
+                   "terms_rescan", "rollups_build", "rollups_cube", "rollups_pivot")),
+    "compare_accounts/10", "compare_accounts/100", "compare_accounts/1000",
+    "compare_loop/10", "compare_loop/100", "end_to_end/10x20", "instances/30",
+]
+
+
+def test_committed_baseline_covers_the_suite(capsys):
+    with open(os.path.join(os.path.dirname(__file__), "..", "benchmarks", "baseline.json"), encoding="utf-8") as f:
+        baseline = json.load(f)
+    assert baseline["commit"]
+    assert sorted(baseline["results"]) == sorted(SUITE_BENCHMARKS)
+    assert all(ms > 0 for ms in baseline["results"].values())
+    assert compare_reports(baseline, baseline) == []
+    assert f"vs {baseline['commit']}" in capsys.readouterr().out
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import charts
+from charts import ChartCache
+
+
+class FakeStorage:
+    """Just the data versions ChartCache keys its renders on."""
+
+    def __init__(self, *usernames):
+        self.versions = {u: (1, 100) for u in usernames}
+
+    def version(self, username):
+        return self.versions.get(username)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """A stub "stub" chart kind: 1000-byte files, slow enough to overlap requests."""
+    calls = []
+
+    def load(storage, username):
+        return pd.Series([storage.version(username)[0]])
+
+    def plot(data, username, path):
+        calls.append(username)
+        time.sleep(0.2)
+        if username == "blank":
+            return None
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1000)
+        return path
+    monkeypatch.setattr(charts, "CHART_KINDS", {"stub": (load, plot)})
+    return calls
+
+
+def test_concurrent_requests_share_one_render(renders, tmp_path):
+    cache = ChartCache(FakeStorage("alice"), chart_dir=str(tmp_path))
+    paths = []
+    threads = [threading.Thread(target=lambda: paths.append(cache.get("alice", "stub"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert renders == ["alice"]
+    assert len(set(paths)) == 1 and os.path.exists(paths[0])
+    assert [f for f in os.listdir(tmp_path) if ".tmp" in f] == []
+
+
+def test_renders_again_only_when_the_data_changes(renders, tmp_path):
+    storage = FakeStorage("alice")
+    cache = ChartCache(storage, chart_dir=str(tmp_path))
+    first = cache.get("alice", "stub")
+    assert cache.get("alice", "stub") == first
+    storage.versions["alice"] = (2, 100)
+    assert cache.get("alice", "stub") != first
+    assert renders == ["alice", "alice"]
+
+
+def test_missing_user_unknown_kind_and_blank_chart(renders, tmp_path):
+    cache = ChartCache(FakeStorage("blank"), chart_dir=str(tmp_path))
+    assert cache.get("nobody", "stub") is None
+    assert cache.get("blank", "nope") is None
+    assert cache.get("blank", "stub") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_evicts_least_recently_used_charts(renders, tmp_path):
+    cache = ChartCache(FakeStorage("alice", "bob", "carol"), chart_dir=str(tmp_path), max_bytes=2500)
+    alice, bob = cache.get("alice", "stub"), cache.get("bob", "stub")
+    old = time.time() - 100
+    os.utime(alice, (old, old))
+    os.utime(bob, (old + 1, old + 1))
+    cache.get("alice", "stub")  # a hit marks alice as recently used
+    carol = cache.get("carol", "stub")
+    assert os.path.exists(alice) and os.path.exists(carol)
+    assert not os.path.exists(bob)
+    assert renders == ["alice", "bob", "carol"]
+
+
+def test_evicts_only_when_over_the_limit(renders, tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    cache = ChartCache(FakeStorage("alice", "bob", "carol"), chart_dir=str(tmp_path), max_bytes=2500)
+    cache.get("alice", "stub")
+    cache.get("bob", "stub")
+    assert len(scans) == 1
+    cache.get("carol", "stub")  # three charts don't fit
+    assert len(scans) == 2
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_digest_covers_column_labels():
+    days = pd.Index(["Monday", "Tuesday"], name="DayOfWeek")
+    early = pd.DataFrame([[1.0, 2.0], [3.0, 4.0]], index=days, columns=pd.Index([5, 7], name="Hour"))
+    late = pd.DataFrame([[1.0, 2.0], [3.0, 4.0]], index=days, columns=pd.Index([6, 9], name="Hour"))
+    assert charts.chart_digest(early, "alice", "heatmap") != charts.chart_digest(late, "alice", "heatmap")
+    assert charts.chart_digest(early, "alice", "heatmap") == charts.chart_digest(early.copy(), "alice", "heatmap")
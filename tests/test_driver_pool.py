@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+
+import driver_pool
+from driver_pool import DriverPool
+
+
+class FakeChrome:
+    """Stands in for webdriver.Chrome; `crash` makes the browser stop answering."""
+    launched = []
+
+    def __init__(self, options=None):
+        self.crash = False
+        self.closed = False
+        FakeChrome.launched.append(self)
+
+    @property
+    def current_url(self):
+        if self.crash or self.closed:
+            raise driver_pool.WebDriverException("chrome not reachable")
+        return "about:blank"
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeBudget:
+    def __init__(self, fits=True, over=False):
+        self.room = fits
+        self.over = over
+
+    def fits(self, mb):
+        return self.room
+
+    def over_budget(self):
+        return self.over
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    FakeChrome.launched = []
+    monkeypatch.setattr(driver_pool.webdriver, "Chrome", FakeChrome)
+    budget = FakeBudget()
+    monkeypatch.setattr(driver_pool, "get_memory_budget", lambda: budget)
+    return budget
+
+
+def test_first_driver_launches_even_without_room(budget):
+    budget.room = False
+    pool = DriverPool(size=2)
+    with pool.driver() as driver:
+        assert driver is FakeChrome.launched[0]
+
+
+def test_waits_for_a_running_driver_when_over_budget(budget):
+    budget.room = False
+    pool = DriverPool(size=2)
+    borrowed = []
+    with pool.driver() as first:
+        waiter = threading.Thread(target=lambda: borrowed.append(pool._checkout(timeout=5).driver))
+        waiter.start()
+        time.sleep(0.2)
+        assert not borrowed  # a second Chrome doesn't fit
+    waiter.join()
+    assert borrowed == [first] and len(FakeChrome.launched) == 1
+
+
+def test_times_out_when_no_driver_comes_back(budget):
+    budget.room = False
+    pool = DriverPool(size=2)
+    with pool.driver():
+        with pytest.raises(TimeoutError):
+            with pool.driver(timeout=0.2):
+                pass
+    # the failed checkout gave its slot back
+    assert pool._slots.acquire(blocking=False) and pool._slots.acquire(blocking=False)
+
+
+def test_drivers_are_closed_instead_of_kept_over_budget(budget):
+    pool = DriverPool(size=2)
+    budget.over = True
+    with pool.driver() as driver:
+        pass
+    assert driver.closed and pool._idle.empty()
+
+
+def test_drivers_are_checked_back_in_and_reused(budget):
+    pool = DriverPool(size=2)
+    with pool.driver() as first:
+        with pool.driver() as second:
+            assert first is not second
+    with pool.driver() as again:
+        assert again is first  # the most recently returned one
+    assert len(FakeChrome.launched) == 2 and not second.closed
+
+
+def test_warm_up_starts_drivers_up_front(budget):
+    pool = DriverPool(size=2, warmup=5)
+    assert len(FakeChrome.launched) == 2
+    with pool.driver():
+        pass
+    assert len(FakeChrome.launched) == 2
+
+
+def test_drivers_are_recycled_after_max_pages(budget):
+    pool = DriverPool(size=1, max_pages=2)
+    for _ in range(3):
+        with pool.driver():
+            pass
+    first, second = FakeChrome.launched
+    assert first.closed and not second.closed
+
+
+def test_crashed_driver_is_discarded(budget):
+    pool = DriverPool(size=1)
+    with pytest.raises(driver_pool.WebDriverException):
+        with pool.driver() as driver:
+            raise driver_pool.WebDriverException("tab crashed")
+    assert driver.closed
+    with pool.driver() as replacement:
+        assert replacement is not driver
+
+
+def test_slow_page_keeps_a_healthy_driver(budget):
+    pool = DriverPool(size=1)
+    with pytest.raises(driver_pool.TimeoutException):
+        with pool.driver() as driver:
+            raise driver_pool.TimeoutException("page load timed out")
+    with pool.driver() as again:
+        assert again is driver
+
+
+def test_unresponsive_idle_driver_is_replaced(budget):
+    pool = DriverPool(size=1)
+    with pool.driver() as driver:
+        pass
+    driver.crash = True
+    with pool.driver() as replacement:
+        assert replacement is not driver
+    assert driver.closed
+
+
+def test_shutdown_closes_every_driver(budget):
+    pool = DriverPool(size=2)
+    with pool.driver():
+        pass
+    borrowed = pool._checkout(timeout=1)
+    pool.shutdown()
+    assert all(d.closed for d in FakeChrome.launched)
+    with pytest.raises(RuntimeError):
+        with pool.driver():
+            pass
+    pool._checkin(borrowed)  # returned after shutdown: closed, not kept
+    assert pool._idle.empty()
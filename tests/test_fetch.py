@@ -0,0 +1,152 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import analytics
+import driver_pool
+import metrics
+from benchmark import TimelineServer
+from conftest import fixture_html
+
+
+def test_parse_timeline_page():
+    data, cursor = analytics.parse_timeline_html(fixture_html("nitter_timeline.html"))
+    assert cursor == "DAABCgABGNvP2u9__-kKAAIYk"
+    # the retweet is skipped
+    assert [t["TweetId"] for t in data] == ["1790000000000000002", "1790000000000000000"]
+    first, second = data
+    assert first["Date"] == "May 13, 2024"
+    assert first["Tweet"] == "shipping the new release today\n#opensource with @nitter"
+    assert (first["Replies"], first["Retweets"], first["Likes"]) == ("12", "1,204", "5,310")
+    assert first["HasMedia"] is True
+    assert (second["Replies"], second["Retweets"], second["Likes"]) == ("0", "0", "7")
+    assert second["HasMedia"] is False
+
+
+def test_parse_empty_timeline():
+    assert analytics.parse_timeline_html(fixture_html("nitter_empty.html")) == ([], None)
+
+
+def test_parse_challenge_page():
+    assert analytics.parse_timeline_html(fixture_html("nitter_challenge.html")) == (None, None)
+
+
+def test_parsed_page_processes():
+    data, _ = analytics.parse_timeline_html(fixture_html("nitter_timeline.html"))
+    df = analytics.process_tweets(analytics.pd.DataFrame(data))
+    assert df["Retweets"].tolist() == [1204, 0]
+    assert df["Datetime"].dt.strftime("%Y-%m-%d").tolist() == ["2024-05-13", "2024-05-11"]
+    assert df["DayOfWeek"].astype(str).tolist() == ["Monday", "Saturday"]
+
+
+class _Response:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+class _Session:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, timeout=None):
+        return self.response
+
+
+@pytest.fixture
+def no_selenium(monkeypatch):
+    calls = []
+
+    def fetch_with_selenium(url):
+        calls.append(url)
+        return [], None
+    monkeypatch.setattr(analytics, "fetch_with_selenium", fetch_with_selenium)
+    return calls
+
+
+def test_auto_falls_back_to_selenium_without_timeline(monkeypatch, no_selenium):
+    monkeypatch.setattr(analytics, "get_http_session",
+                        lambda: _Session(_Response(fixture_html("nitter_challenge.html"))))
+    assert analytics.fetch_timeline("http://nitter.test/jack", backend="auto") == ([], None)
+    assert no_selenium == ["http://nitter.test/jack"]
+
+
+def test_auto_raises_on_http_error(no_selenium):
+    with TimelineServer(pages=1, error_rate=1.0) as server:
+        with pytest.raises(analytics.FetchError, match="503"):
+            analytics.fetch_timeline(server.url + "/jack", backend="auto")
+    assert no_selenium == []
+
+
+def test_auto_raises_on_connection_error(no_selenium):
+    server = TimelineServer(pages=1)
+    server.stop()  # nothing listens on its port any more
+    with pytest.raises(analytics.FetchError):
+        analytics.fetch_timeline(server.url + "/jack", backend="auto")
+    assert no_selenium == []
+
+
+def test_http_backend_single_page_has_no_cursor():
+    with TimelineServer(pages=1, page_size=3) as server:
+        data, cursor = analytics.fetch_timeline(server.url + "/jack", backend="http")
+    assert len(data) == 3 and cursor is None
+
+
+class _ScriptDriver:
+    """Answers the extraction script with canned rows; counts WebDriver calls."""
+
+    def __init__(self, result):
+        self.result = result
+        self.scripts = []
+        self.lookups = 0
+
+    def set_page_load_timeout(self, timeout):
+        pass
+
+    def get(self, url):
+        self.url = url
+
+    def find_elements(self, by, selector):
+        self.lookups += 1
+        return [object()]
+
+    def execute_script(self, script):
+        self.scripts.append(script)
+        return json.dumps(self.result)
+
+
+class _OnePool:
+    def __init__(self, driver):
+        self._driver = driver
+
+    @contextmanager
+    def driver(self, timeout=None):
+        yield self._driver
+
+
+def _script_row(tweet_id, likes="7"):
+    return {"TweetId": tweet_id, "Date": "May 13, 2024", "Tweet": "hello", "Replies": "0",
+            "Retweets": "0", "Likes": likes, "HasMedia": False}
+
+
+def test_script_extraction_reads_a_page_in_one_call(monkeypatch):
+    # the second row's status link had no href
+    rows = [_script_row("1790000000000000002", "5,310"), _script_row(None)]
+    driver = _ScriptDriver({"data": rows, "skipped": 1,
+                            "more": "http://nitter.test/jack?cursor=DAABCgAB"})
+    monkeypatch.setattr(driver_pool, "get_driver_pool", lambda: _OnePool(driver))
+    metrics.enable()
+    try:
+        metrics.reset()
+        data, cursor = analytics.fetch_with_selenium("http://nitter.test/jack", extraction="script")
+        skipped = metrics.render_prometheus()
+    finally:
+        metrics.enable(False)
+        metrics.reset()
+    assert driver.scripts == [analytics.EXTRACT_TIMELINE_JS]
+    assert driver.lookups == 1  # just the wait for the timeline
+    assert data == rows and cursor == "DAABCgAB"
+    assert 'xstats_items_skipped_total{backend="selenium"} 1' in skipped
+    df = analytics.process_tweets(analytics.pd.DataFrame(data))
+    assert df["Likes"].tolist() == [5310, 7]
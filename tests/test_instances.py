@@ -0,0 +1,96 @@
+import pytest
+
+import analytics
+from benchmark import TimelineServer
+from instances import InstancePool
+from page_cache import PageCache
+
+
+@pytest.fixture
+def servers():
+    failing = TimelineServer(pages=3, error_rate=1.0).start()
+    healthy = TimelineServer(pages=3, page_size=5).start()
+    yield failing, healthy
+    failing.stop()
+    healthy.stop()
+
+
+@pytest.fixture
+def no_selenium(monkeypatch):
+    calls = []
+
+    def fetch_with_selenium(url):
+        calls.append(url)
+        return None, None
+    monkeypatch.setattr(analytics, "fetch_with_selenium", fetch_with_selenium)
+    monkeypatch.setattr(analytics, "FETCH_BACKEND", "auto")
+    return calls
+
+
+def test_failed_page_moves_to_another_instance(servers, no_selenium, tmp_path, monkeypatch):
+    failing, healthy = servers
+    monkeypatch.setattr(analytics, "get_page_cache", lambda: PageCache(str(tmp_path)))
+    # The failing instance is listed first, so it gets the first request
+    pool = InstancePool([failing.url, healthy.url], rate=1000, burst=1000, threshold=1, cooldown=60)
+
+    pages = list(analytics.iter_timeline("someone", max_tweets=100, pool=pool, refresh=True))
+
+    assert [len(page) for page in pages] == [5, 5, 5]
+    assert failing.requests == 1 and failing.errors == 1
+    assert healthy.requests == 3
+    assert no_selenium == []  # HTTP errors never launch a browser
+    status = {s["url"]: s for s in pool.status()}
+    assert status[failing.url]["circuit"] == "open"
+    assert status[healthy.url]["circuit"] == "closed"
+    assert status[healthy.url]["error_rate"] == 0.0
+
+
+def test_breaker_opens_after_threshold(servers, no_selenium):
+    failing, healthy = servers
+    pool = InstancePool([failing.url], rate=1000, burst=1000, threshold=3, cooldown=60, attempts=1)
+
+    for expected in ("closed", "closed", "open"):
+        assert pool.fetch("/someone", analytics._fetch_page) == (None, None)
+        assert pool.status()[0]["circuit"] == expected
+    assert failing.requests == 3
+    assert no_selenium == []
+
+
+def test_open_instance_is_skipped(servers, no_selenium):
+    failing, healthy = servers
+    pool = InstancePool([failing.url, healthy.url], rate=1000, burst=1000, threshold=1, cooldown=60)
+    pool.record(pool.instances[1], True, 0.5)  # healthy but slower than an untried instance
+
+    data, cursor = pool.fetch("/someone", analytics._fetch_page)
+    assert len(data) == 5 and cursor == "1"
+    data, cursor = pool.fetch("/someone?cursor=1", analytics._fetch_page)
+    assert len(data) == 5 and cursor == "2"
+    # one failure opened the circuit, so the second page went straight to the healthy one
+    assert failing.requests == 1
+    assert healthy.requests == 2
+
+
+def test_failing_instance_ranks_below_a_healthy_one(servers, no_selenium):
+    failing, healthy = servers
+    # Default breaker threshold: the score alone has to keep the failing one out
+    pool = InstancePool([failing.url, healthy.url], rate=1000, burst=1000)
+    pool.record(pool.instances[1], True, 0.8)
+
+    for page in ("", "?cursor=1", "?cursor=2"):
+        data, _ = pool.fetch("/someone" + page, analytics._fetch_page)
+        assert len(data) == 5
+    assert failing.requests == 1 and healthy.requests == 3
+    assert pool.status()[0]["circuit"] == "closed"
+
+
+def test_timeouts_count_against_the_score():
+    pool = InstancePool(["https://dead.test", "https://ok.test"], rate=1000, burst=1000)
+    dead, ok = pool.instances
+    pool.record(ok, True, 0.8)
+    pool.record(dead, False, 30.0)
+    assert dead.score(0) > ok.score(0)
+    # a few slow successes later, the healthy one still wins
+    for _ in range(3):
+        pool.record(ok, True, 2.0)
+    assert dead.score(0) > ok.score(0)
+    assert pool.acquire() is ok
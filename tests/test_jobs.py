@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """run_analysis blocks until the event is set; "missing" fails."""
+    release = threading.Event()
+    calls = []
+
+    def run_analysis(username, max_tweets=20):
+        calls.append(username)
+        release.wait(10)
+        if username == "missing":
+            raise ValueError(f"No data found for @{username}")
+        return {"tweets": 5, "peak_rss_mb": 1.0}
+    monkeypatch.setattr(jobs, "run_analysis", run_analysis)
+    release.calls = calls
+    return release
+
+
+def _wait(job):
+    for future in job.futures.values():
+        future.exception(timeout=10)
+
+
+def test_in_flight_users_share_one_analysis(gate):
+    queue = jobs.JobQueue(max_workers=2)
+    first = queue.submit(["alice", "bob"])
+    second = queue.submit(["bob"])
+    assert second.futures["bob"] is first.futures["bob"]
+    assert queue.get(first.id) is first
+    gate.set()
+    _wait(first)
+    assert sorted(gate.calls) == ["alice", "bob"]
+    # finished analyses are not reused: asking again runs a new one
+    third = queue.submit(["bob"])
+    _wait(third)
+    assert third.futures["bob"] is not first.futures["bob"]
+    queue.shutdown()
+
+
+def test_status(gate):
+    queue = jobs.JobQueue(max_workers=1)
+    job = queue.submit(["alice", "missing"])
+    status = job.status()
+    assert status["state"] in ("queued", "running")
+    assert status["users"]["missing"] == {"state": "queued"}
+    gate.set()
+    _wait(job)
+    status = job.status()
+    assert status["state"] == "done"
+    assert status["users"]["alice"] == {"state": "done", "tweets": 5, "peak_rss_mb": 1.0}
+    assert status["users"]["missing"] == {"state": "failed", "error": "No data found for @missing"}
+    queue.shutdown()
+
+
+def test_all_failed(gate):
+    gate.set()
+    queue = jobs.JobQueue(max_workers=1)
+    job = queue.submit(["missing"])
+    _wait(job)
+    assert job.status()["state"] == "failed"
+    assert queue.get("nope") is None
+    queue.shutdown()
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+import memory
+from memory import MemoryBudget
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Stubbed process RSS in MB; set rss["mb"] to move it."""
+    rss = {"mb": 100.0}
+    monkeypatch.setattr(memory, "rss_mb", lambda: rss["mb"])
+    return rss
+
+
+def test_first_reservation_is_always_granted(rss):
+    budget = MemoryBudget(budget_mb=50)  # smaller than the process already is
+    assert budget.acquire(100, block=False)
+    assert budget.holders == 1 and budget.reserved_mb == 100
+
+
+def test_reservations_wait_for_room(rss):
+    budget = MemoryBudget(budget_mb=300)
+    assert budget.acquire(150, block=False)  # 100 baseline + 150
+    assert not budget.acquire(100, block=False)
+    start = time.monotonic()
+    assert not budget.acquire(100, timeout=0.2)
+    assert time.monotonic() - start >= 0.2
+    assert budget.waiting == 0
+    budget.release(150)
+    assert budget.acquire(100, block=False)
+
+
+def test_measured_rss_counts_against_the_budget(rss):
+    budget = MemoryBudget(budget_mb=300)
+    budget.acquire(50)
+    assert budget.fits(100)
+    rss["mb"] = 250  # more than baseline + reserved
+    assert not budget.fits(100)
+    assert not budget.over_budget()
+    rss["mb"] = 350
+    assert budget.over_budget()
+
+
+def test_blocked_reservation_is_woken_by_release(rss):
+    budget = MemoryBudget(budget_mb=300)
+    budget.acquire(150)
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(budget.acquire(150, timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert budget.waiting == 1 and not granted
+    budget.release(150)
+    waiter.join()
+    assert granted == [True] and budget.holders == 1
+
+
+def test_no_budget_admits_everything(rss):
+    budget = MemoryBudget(budget_mb=0)
+    assert all(budget.acquire(1000, block=False) for _ in range(3))
+    assert not budget.over_budget()
+
+
+def test_job_releases_its_reservation(rss, monkeypatch):
+    budget = MemoryBudget(budget_mb=300)
+    monkeypatch.setattr(memory, "_budget", budget)
+    with pytest.raises(ValueError):
+        with memory.job("@someone", mb=150) as tracker:
+            assert budget.status()["reserved_mb"] == 150
+            rss["mb"] = 180
+            raise ValueError("scrape failed")
+    assert budget.holders == 0 and budget.reserved_mb == 0
+    assert tracker.peak_mb == 180
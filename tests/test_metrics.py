@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def test_disabled_records_nothing():
+    metrics.reset()
+    with metrics.timed("fetch"):
+        metrics.inc("xstats_tweets_fetched_total", 5)
+    assert metrics.render_prometheus() == "\n"
+
+
+def test_prometheus_text_format(recording, monkeypatch):
+    clock = iter([10.0, 10.03, 20.0, 21.5])
+    monkeypatch.setattr(metrics.time, "perf_counter", lambda: next(clock))
+    with metrics.timed("fetch"):
+        pass
+    with metrics.timed("fetch"):
+        pass
+    metrics.inc("xstats_tweets_fetched_total", 20)
+    metrics.inc("xstats_fetch_failures_total", instance="https://a.test", backend="http")
+    text = metrics.render_prometheus({"xstats_rss_mb": 120})
+
+    lines = text.splitlines()
+    assert "# TYPE xstats_stage_duration_seconds histogram" in lines
+    assert 'xstats_stage_duration_seconds_bucket{stage="fetch",le="0.025"} 0' in lines
+    assert 'xstats_stage_duration_seconds_bucket{stage="fetch",le="0.05"} 1' in lines
+    assert 'xstats_stage_duration_seconds_bucket{stage="fetch",le="2.5"} 2' in lines
+    assert 'xstats_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 2' in lines
+    assert 'xstats_stage_duration_seconds_count{stage="fetch"} 2' in lines
+    total = next(l for l in lines if l.startswith("xstats_stage_duration_seconds_sum"))
+    assert float(total.split()[-1]) == pytest.approx(1.53)
+    assert "# TYPE xstats_tweets_fetched_total counter" in lines
+    assert "xstats_tweets_fetched_total 20" in lines
+    assert 'xstats_fetch_failures_total{backend="http",instance="https://a.test"} 1' in lines
+    assert lines[-2:] == ["# TYPE xstats_rss_mb gauge", "xstats_rss_mb 120"]
+    # every sample line is `name{labels} value`, with one TYPE line per metric
+    sample = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? [0-9.e+-]+$')
+    assert all(sample.match(l) for l in lines if not l.startswith("#"))
+    types = [l.split()[2] for l in lines if l.startswith("# TYPE")]
+    assert len(types) == len(set(types))
+
+
+def test_profile_breakdown(recording, capsys):
+    with metrics.timed("parse"):
+        metrics.inc("xstats_tweets_fetched_total", 3)
+    metrics.print_breakdown()
+    out = capsys.readouterr().out
+    assert "Stage breakdown:" in out
+    assert re.search(r"^parse\s+1\s", out, re.M)
+    assert "xstats_tweets_fetched_total: 3" in out
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import threading
+
+import page_cache
+from page_cache import PageCache
+
+RECORDS = [{"TweetId": "1", "Date": "Jan 5, 2024", "Tweet": "hello", "Replies": "0",
+            "Retweets": "0", "Likes": "1", "HasMedia": False}]
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = PageCache(str(tmp_path))
+    assert cache.get("someone") is None
+    cache.put("someone", None, RECORDS, "2")
+    cache.put("someone", "2", [], None)
+    assert cache.get("SomeOne") == (RECORDS, "2")  # usernames are case-insensitive
+    assert cache.get("someone", "2") == ([], None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["bytes_saved"] > 0
+
+
+def test_failed_pages_are_not_cached(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("someone", None, None, None)
+    assert os.listdir(tmp_path) == []
+
+
+def test_expired_and_disabled(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+    cache.put("someone", None, RECORDS, None)
+    assert cache.get("someone") is not None
+    path = cache.path("someone", None)
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["fetched_at"] -= 120
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    assert cache.get("someone") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 1)
+    off = PageCache(str(tmp_path / "off"), ttl=0)
+    off.put("someone", None, RECORDS, None)
+    assert off.get("someone") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10**9)
+    for i in range(3):
+        cache.put(f"user{i}", None, RECORDS * 20, None)
+    old = time.time() - 100
+    for i in range(3):
+        os.utime(cache.path(f"user{i}", None), (old + i, old + i))
+    cache.get("user0")  # now the most recently used
+    # Room for exactly the two entries that should stay
+    cache.max_bytes = sum(os.path.getsize(cache.path(u, None)) for u in ("user0", "user2"))
+    cache.evict()
+    assert cache.get("user1") is None
+    assert cache.get("user0") is not None and cache.get("user2") is not None
+
+
+def test_scans_only_when_the_running_total_crosses_the_limit(tmp_path, monkeypatch):
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    cache = PageCache(str(tmp_path), max_bytes=10**9)
+    for i in range(5):
+        cache.put(f"user{i}", None, RECORDS, None)
+    assert len(scans) == 1  # the first put learns the directory size
+    # Room for five entries; the slack absorbs timestamps of different lengths
+    cache.max_bytes = sum(os.path.getsize(cache.path(f"user{i}", None)) for i in range(5)) + 50
+    cache.put("user0", None, RECORDS, None)  # an overwrite counts twice, so this rescans
+    assert len(scans) == 2
+    cache.put("user5", None, RECORDS, None)
+    assert len(scans) == 3
+    assert len(os.listdir(tmp_path)) == 5
+
+
+def test_concurrent_callers_share_one_cache(tmp_path, monkeypatch):
+    built = []
+
+    class SlowPageCache(PageCache):
+        def __init__(self):
+            time.sleep(0.05)  # long enough for the callers to overlap
+            built.append(self)
+            super().__init__(str(tmp_path))
+
+    monkeypatch.setattr(page_cache, "PageCache", SlowPageCache)
+    monkeypatch.setattr(page_cache, "_cache", None)
+    caches = []
+    threads = [threading.Thread(target=lambda: caches.append(page_cache.get_page_cache()))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(built) == 1
+    assert all(cache is built[0] for cache in caches)
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+from benchmark import make_raw_frame, reference_process_tweets
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+RAW = pd.DataFrame({
+    "TweetId": ["105", "104", "103", "102", "101"],
+    "Date": ["5m", "3h", "Jan 5, 2024", "Dec 31, 2023", "Feb 29, 2024"],
+    "Tweet": ["hello @alice #launch https://example.com/a",
+              "no tags here",
+              "#one #two and @bob",
+              "see https://x.com/status/1 now",
+              "multi\nline  tweet"],
+    "Replies": ["1", "0", "12", "3", "0"],
+    "Retweets": ["2", "1,204", "0", "7", "0"],
+    "Likes": ["10", "5,310", "1", "", "0"],
+    "HasMedia": [True, False, False, True, False],
+})
+
+
+def _compare(raw, **kwargs):
+    expected = reference_process_tweets(raw.copy(), NOW)
+    actual = analytics.process_tweets(raw.copy(), now=NOW, keep_lists=True, **kwargs)
+    # DayOfWeek is categorical and the counters are narrower; compare the values
+    actual = actual.astype({"DayOfWeek": expected["DayOfWeek"].dtype})
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_matches_reference_on_fixed_frame():
+    _compare(RAW.drop(columns="TweetId"))  # the original had no tweet ids
+
+
+def test_fixed_frame_values():
+    df = analytics.process_tweets(RAW.copy(), now=NOW, keep_lists=True)
+    assert df["Datetime"].tolist() == [pd.Timestamp("2025-06-01 11:55"), pd.Timestamp("2025-06-01 09:00"),
+                                       pd.Timestamp("2024-01-05"), pd.Timestamp("2023-12-31"),
+                                       pd.Timestamp("2024-02-29")]
+    assert df["Engagement"].tolist() == [13, 6514, 13, 10, 0]
+    assert df["Hashtags"].tolist()[2] == ["#one", "#two"]
+    assert df["HasHashtags"].tolist() == [True, False, True, False, False]
+    assert df["HasLinks"].tolist() == [True, False, False, True, False]
+    assert df["WordCount"].tolist() == [4, 3, 4, 3, 3]
+    assert df["TweetId"].tolist() == [105, 104, 103, 102, 101]
+
+
+def test_matches_reference_on_synthetic_frame():
+    _compare(make_raw_frame(2000, seed=3))
+
+
+def test_chunked_matches_reference(monkeypatch):
+    monkeypatch.setattr(analytics, "CHUNK_ROWS", 300)
+    _compare(make_raw_frame(1000, seed=4))
+
+
+def test_compact_dtypes_and_no_lists():
+    df = analytics.process_tweets(RAW.copy(), now=NOW, keep_lists=False)
+    for col in ("Hashtags", "Mentions", "Links"):
+        assert col not in df
+    assert df["Hour"].dtype == "int8"
+    assert df["WordCount"].dtype == "int16"
+    assert {df[c].dtype for c in ("Replies", "Retweets", "Likes")} == {pd.Series([], dtype="int32").dtype}
+    assert list(df["DayOfWeek"].cat.categories) == analytics.DAYS
+
+
+def test_empty_frame_is_returned_as_is():
+    empty = pd.DataFrame(columns=RAW.columns)
+    assert analytics.process_tweets(empty) is empty
+
+
+def test_tweet_ids_keep_full_precision_next_to_missing_ones():
+    raw = RAW.iloc[:3].assign(TweetId=["1790000000000000002", None, "1790000000000000001"])
+    df = analytics.process_tweets(raw.copy(), now=NOW)
+    assert df["TweetId"].tolist() == [1790000000000000002, pd.NA, 1790000000000000001]
@@ -0,0 +1,54 @@
+import pytest
+
+from benchmark import make_tweet_frame
+from registry import Registry
+from storage import FeatherStorage
+
+HOUR = 3600
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return Registry(str(tmp_path / "registry.db"))
+
+
+def test_users_newest_first_with_chart_totals(registry):
+    registry.record_user("old", "data/old.feather", 10, 1000, fetched_at=100)
+    registry.record_user("new", "data/new.feather", 20, 2000, fetched_at=200)
+    registry.record_chart("old", "heatmap", "static/charts/a.png", 300)
+    registry.record_chart("old", "wordcloud", "static/charts/b.png", 200)
+    assert registry.list_users() == ["new", "old"]
+    old = registry.users()[1]
+    assert (old["row_count"], old["charts"], old["chart_bytes"]) == (10, 2, 500)
+    # re-recording updates in place
+    registry.record_user("old", "data/old.feather", 15, 1500, fetched_at=300)
+    assert registry.list_users() == ["old", "new"]
+
+
+def test_remove_user_returns_charts(registry):
+    registry.record_user("someone", "data/someone.feather", 10, 1000)
+    registry.record_chart("someone", "heatmap", "static/charts/a.png", 300)
+    assert registry.remove_user("someone") == ["static/charts/a.png"]
+    assert registry.users() == []
+    assert registry.remove_user("someone") == []
+
+
+def test_sync_with_storage(registry, tmp_path):
+    storage = FeatherStorage(str(tmp_path / "data"))
+    storage.save("ondisk", make_tweet_frame(12))
+    registry.record_user("vanished", "data/vanished.feather", 5, 500)
+    registry.sync(storage)
+    users = registry.users()
+    assert [u["username"] for u in users] == ["ondisk"]
+    assert users[0]["row_count"] == 12
+
+
+def test_over_quota(registry):
+    now = 10 * HOUR
+    for i, name in enumerate(["a", "b", "c", "d"]):
+        registry.record_user(name, f"data/{name}.feather", 1, 1024 * 1024, fetched_at=now - i * HOUR)
+    assert registry.over_quota(max_age_hours=2.5, max_users=0, quota_mb=0, now=now) == ["d"]
+    assert registry.over_quota(max_age_hours=0, max_users=2, quota_mb=0, now=now) == ["d", "c"]
+    assert registry.over_quota(max_age_hours=0, max_users=0, quota_mb=3, now=now) == ["d"]
+    registry.record_chart("a", "heatmap", "static/charts/a.png", 1024 * 1024)
+    assert registry.over_quota(max_age_hours=0, max_users=0, quota_mb=3, now=now) == ["d", "c"]
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from benchmark import make_tweet_frame
+from rollups import Rollups, get_rollups, update_rollups
+from storage import FeatherStorage
+
+
+def test_cube_matches_pivot():
+    df = make_tweet_frame(2000)
+    expected = df.pivot_table(values="Engagement", index="DayOfWeek", columns="Hour",
+                              aggfunc="mean", observed=True, fill_value=0)
+    expected.index = expected.index.astype(str)
+    cube = Rollups.from_tweets(df).cube()
+    pd.testing.assert_frame_equal(cube.loc[expected.index, expected.columns], expected,
+                                  check_dtype=False, check_names=False,
+                                  check_index_type=False, check_column_type=False)
+
+
+def test_best_time_and_series():
+    df = make_tweet_frame(1000)
+    rollups = Rollups.from_tweets(df)
+    by_day = df.groupby("DayOfWeek", observed=True)["Engagement"].mean()
+    by_hour = df.groupby("Hour")["Engagement"].mean()
+    assert rollups.best_time() == (by_day.idxmax(), int(by_hour.idxmax()))
+    series = rollups.series("MS")
+    assert series["count"].sum() == df["Datetime"].notna().sum()
+    assert Rollups().best_time() == (None, None)
+
+
+def test_window():
+    df = make_tweet_frame(1000)
+    window = Rollups.from_tweets(df).window("2022-01-01", "2022-12-31")
+    in_2022 = df[df["Datetime"].dt.year == 2022]
+    assert window.table["count"].sum() == len(in_2022)
+    assert window.table["Engagement"].sum() == in_2022["Engagement"].sum()
+
+
+def test_refreshed_counts_replace_old_ones(tmp_path):
+    storage = FeatherStorage(str(tmp_path))
+    df = make_tweet_frame(300)
+    storage.save("someone", df)
+    update_rollups(storage, "someone", df)
+    refreshed = df.iloc[:50].assign(Likes=df["Likes"].iloc[:50] + 10,
+                                    Engagement=df["Engagement"].iloc[:50] + 10)
+    merged = pd.concat([refreshed, df.iloc[50:]], ignore_index=True)
+    previous = storage.version("someone")
+    storage.save("someone", merged)
+    updated = update_rollups(storage, "someone", refreshed, df.iloc[:50], previous)
+    assert updated.table["count"].sum() == merged["Datetime"].notna().sum()
+    assert updated.table["Engagement"].sum() == merged.loc[merged["Datetime"].notna(), "Engagement"].sum()
+    pd.testing.assert_frame_equal(get_rollups(storage, "someone").table, Rollups.from_tweets(merged).table)
@@ -0,0 +1,23 @@
+import pytest
+
+import stats
+from benchmark import make_tweet_frame
+from storage import get_storage
+
+
+@pytest.mark.parametrize("fmt", ["feather", "csv"])
+def test_refresh_summary_streams_the_same_summary(fmt, tmp_path, monkeypatch):
+    storage = get_storage(fmt, str(tmp_path))
+    df = make_tweet_frame(1000)
+    storage.save("someone", df)
+    expected = stats.compute_summary(storage.load("someone", columns=stats.SUMMARY_COLUMNS),
+                                     source=storage.version("someone"))
+    monkeypatch.setattr(stats, "CHUNK_ROWS", 300)  # several chunks
+    loads = []
+    monkeypatch.setattr(storage, "load", lambda *a, **kw: loads.append(a))
+    summary = stats.refresh_summary(storage, "someone")
+    assert loads == []  # never reads the whole history
+    assert summary == expected
+    assert summary["tweet_activity"]["total_tweets"] == 1000
+    assert len(summary["recent_tweets"]) == stats.RECENT_TWEETS
+    assert storage.load_summary("someone")["engagement"] == expected["engagement"]
@@ -0,0 +1,116 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import analytics
+import storage as storage_module
+from benchmark import make_raw_frame
+from storage import CsvStorage, FeatherStorage, migrate_csv_files
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+def _pages(n=3, size=40):
+    raw = make_raw_frame(n * size, with_ids=True)
+    return [analytics.process_tweets(raw.iloc[i * size:(i + 1) * size].copy(), now=NOW, keep_lists=True)
+            for i in range(n)]
+
+
+@pytest.fixture(params=[CsvStorage, FeatherStorage])
+def storage(request, tmp_path):
+    return request.param(str(tmp_path))
+
+
+def _leftovers(storage):
+    return [f for f in os.listdir(storage.data_dir) if f.endswith(".tmp")]
+
+
+def test_writer_matches_save(storage):
+    pages = _pages()
+    with storage.writer("paged") as out:
+        for page in pages:
+            out.write(page)
+    storage.save("whole", pd.concat(pages, ignore_index=True))
+    assert out.rows == 120
+    pd.testing.assert_frame_equal(storage.load("paged"), storage.load("whole"))
+    assert _leftovers(storage) == []
+
+
+def test_writer_lines_up_pages_of_different_shapes(storage):
+    first = analytics.process_tweets(pd.DataFrame({
+        "TweetId": ["2"], "Date": ["Jan 5, 2024"], "Tweet": ["no tags"],
+        "Replies": ["0"], "Retweets": ["0"], "Likes": ["1"], "HasMedia": [False]}),
+        now=NOW, keep_lists=True)
+    second = _pages(1)[0]
+    with storage.writer("someone") as out:
+        out.write(first)
+        out.write(second)
+    df = storage.load("someone")
+    assert len(df) == 41
+    assert list(df["Hashtags"].iloc[0]) == []
+
+
+def test_writer_keeps_old_file_without_rows_or_on_error(storage):
+    page = _pages(1)[0]
+    storage.save("someone", page)
+    version = storage.version("someone")
+    with storage.writer("someone"):
+        pass
+    with pytest.raises(RuntimeError):
+        with storage.writer("someone") as out:
+            out.write(page)
+            raise RuntimeError("fetch failed")
+    assert storage.version("someone") == version
+    assert _leftovers(storage) == []
+
+
+def test_migrate_keeps_sidecars(tmp_path):
+    legacy = CsvStorage(str(tmp_path))
+    legacy.save("someone", _pages(1)[0])
+    legacy.save_sidecar("someone", "terms", {"source": None})
+    storage = migrate_csv_files(FeatherStorage(str(tmp_path)))
+    assert not legacy.exists("someone")
+    assert storage.row_count("someone") == 40
+    assert storage.load_sidecar("someone", "terms") == {"source": None}
+
+
+def test_feather_is_read_from_the_memory_map(tmp_path):
+    storage = FeatherStorage(str(tmp_path))
+    pages = _pages()
+    storage.save("saved", pages[0])
+    with storage.writer("paged") as out:
+        for page in pages:
+            out.write(page)
+    for username in ("saved", "paged"):
+        before = pa.total_allocated_bytes()
+        table = storage.load_table(username)
+        # Uncompressed buffers point into the mapped file instead of the heap
+        assert pa.total_allocated_bytes() == before
+        assert table.num_rows
+
+
+def test_iter_chunks(storage):
+    with storage.writer("someone") as out:
+        for page in _pages():
+            out.write(page)
+    chunks = list(storage.iter_chunks("someone", ["TweetId", "Likes"], rows=50))
+    assert [len(c) for c in chunks] == [50, 50, 20]
+    assert list(chunks[0].columns) == ["TweetId", "Likes"]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  storage.load("someone", ["TweetId", "Likes"]))
+    assert storage.row_count("someone") == 120
+    assert storage.columns("someone") == list(storage.load("someone").columns)
+
+
+def test_compressed_feather_metadata_reads_no_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, "FEATHER_COMPRESSION", "lz4")
+    storage = FeatherStorage(str(tmp_path))
+    storage.save("someone", pd.concat(_pages(), ignore_index=True))
+    before = pa.total_allocated_bytes()
+    assert storage.row_count("someone") == 120
+    assert "TweetId" in storage.columns("someone")
+    assert pa.total_allocated_bytes() == before
+    assert sum(len(c) for c in storage.iter_chunks("someone", rows=50)) == 120
@@ -0,0 +1,50 @@
+import analytics
+import benchmark
+import terms
+from benchmark import make_raw_frame, make_tweet_frame
+from storage import FeatherStorage
+
+
+def test_index_without_lists_matches_lists():
+    raw = make_raw_frame(500, seed=1)
+    with_lists = analytics.process_tweets(raw.copy(), keep_lists=True)
+    without = analytics.process_tweets(raw.copy(), keep_lists=False)
+    assert terms.TermIndex.from_tweets(with_lists).counts == terms.TermIndex.from_tweets(without).counts
+
+
+def test_top_terms():
+    df = analytics.process_tweets(make_raw_frame(3, seed=0).assign(
+        Tweet=["#a #b @x", "#a @x @y", "#a words https://www.example.com/1"]), keep_lists=True)
+    index = terms.TermIndex.from_tweets(df)
+    assert index.top("hashtags", 2) == [("#a", 3), ("#b", 1)]
+    assert index.top("mentions", 1) == [("@x", 2)]
+    assert index.top("domains") == [("example.com", 1)]
+    assert index.tweets == 3
+
+
+def test_update_matches_rebuild(tmp_path):
+    storage = FeatherStorage(str(tmp_path))
+    df = make_tweet_frame(300)
+    first, second = df.iloc[:200], df.iloc[200:]
+    storage.save("someone", first)
+    terms.update_terms(storage, "someone", first)
+    previous = storage.version("someone")
+    storage.save("someone", df)
+    updated = terms.update_terms(storage, "someone", second, previous)
+    assert updated.counts == terms.TermIndex.from_tweets(df).counts
+    assert terms.get_terms(storage, "someone").counts == updated.counts
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    storage = FeatherStorage(str(tmp_path))
+    df = make_tweet_frame(100)
+    storage.save("someone", df)
+    storage.save_sidecar("someone", "terms", {"source": [0, 0], "tweets": 1, "counts": {}})
+    assert terms.get_terms(storage, "someone").tweets == 100
+
+
+def test_bench_terms_without_lists(monkeypatch):
+    monkeypatch.setattr(analytics, "KEEP_LISTS", False)
+    assert "Hashtags" not in make_tweet_frame(10)
+    results = benchmark.bench_terms(sizes=(200,), repeat=1)
+    assert set(results) == {"terms_build/200", "terms_top/200", "terms_rescan/200"}
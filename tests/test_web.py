@@ -0,0 +1,165 @@
+import gzip
+import json
+
+import pytest
+
+import compare
+import metrics
+import web_dashboard
+from benchmark import make_tweet_frame
+from registry import Registry
+from stats import refresh_summary
+from storage import FeatherStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = FeatherStorage(str(tmp_path / "data"))
+    for i, username in enumerate(["alice", "bob"]):
+        storage.save(username, make_tweet_frame(200, seed=i))
+        refresh_summary(storage, username)
+    return storage
+
+
+@pytest.fixture
+def client(storage, tmp_path):
+    app = web_dashboard.create_app(storage=storage, user_registry=Registry(str(tmp_path / "registry.db")),
+                                   chart_dir=str(tmp_path / "charts"), janitor=False)
+    return app.test_client()
+
+
+def test_create_app_indexes_existing_users(client):
+    assert sorted(web_dashboard.registry.list_users()) == ["alice", "bob"]
+    response = client.get("/")
+    assert response.status_code == 200
+    assert b"alice" in response.data
+
+
+def test_user_stats(client):
+    response = client.get("/api/user/alice/stats")
+    assert response.status_code == 200
+    assert response.get_json()["stats"]["tweet_activity"]["total_tweets"] == 200
+    again = client.get("/api/user/alice/stats", headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/api/user/nobody/stats").status_code == 404
+
+
+def test_gzip_variant_has_its_own_etag(client):
+    plain = client.get("/api/user/alice/stats")
+    response = client.get("/api/user/alice/stats", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+    assert response.headers["ETag"] != plain.headers["ETag"]
+    again = client.get("/api/user/alice/stats", headers={"Accept-Encoding": "gzip",
+                                                         "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+    # the identity copy doesn't validate the gzip one, and vice versa
+    assert client.get("/api/user/alice/stats", headers={"If-None-Match": response.headers["ETag"]}
+                      ).status_code == 200
+
+
+@pytest.mark.parametrize("accept", ["gzip;q=0", "identity, gzip;q=0", "br"])
+def test_gzip_only_when_accepted(client, accept):
+    response = client.get("/api/user/alice/stats", headers={"Accept-Encoding": accept})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json()["stats"]["tweet_activity"]["total_tweets"] == 200
+
+
+def test_delete_user(client, storage):
+    assert client.post("/delete/bob").status_code == 302
+    assert not storage.exists("bob")
+    assert web_dashboard.registry.list_users() == ["alice"]
+
+
+@pytest.mark.parametrize("k, expected", [("-3", 1), ("1", 1), ("5000", 2), ("", 2)])
+def test_compare_page_size_is_clamped(client, k, expected):
+    response = client.get(f"/api/compare?users=alice,bob&k={k}&offset=-4")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["offset"] == 0
+    assert {len(ranked) for ranked in body["comparison"].values()} == {expected}
+
+
+def test_terms_n_is_clamped(client):
+    body = client.get("/api/terms?users=alice,bob&n=-2").get_json()
+    assert body["tweets"] == 400
+    assert all(len(top) == 1 for top in body["top"].values())
+    assert client.get("/api/terms?users=nobody").status_code == 400
+
+
+@pytest.mark.parametrize("query", ["start=garbage", "end=2024-13-01", "start=2024-01-01&end=junk"])
+def test_timeline_rejects_bad_dates(client, query):
+    response = client.get(f"/api/timeline?users=alice&{query}")
+    assert response.status_code == 400
+    assert "must be a date" in response.get_json()["error"]
+
+
+def test_timeline_window_and_etag(client):
+    whole = client.get("/api/timeline?users=alice,bob&period=month").get_json()
+    assert sum(p["tweets"] for p in whole["periods"]) == 400
+    window = client.get("/api/timeline?users=alice,bob&period=month&start=2021-01-01&end=2021-12-31")
+    periods = window.get_json()["periods"]
+    assert periods and all(p["start"].startswith("2021") for p in periods)
+    # the same window spelled differently is the same representation
+    other = client.get("/api/timeline?users=alice,bob&period=month&start=2021-01-01T00:00&end=Dec 31 2021")
+    assert other.headers["ETag"] == window.headers["ETag"]
+    assert client.get("/api/timeline?users=alice&period=year").status_code == 400
+
+
+def test_compare_pages_reuse_the_metrics_table(client, storage, monkeypatch):
+    loads = []
+    load_accounts = compare.load_accounts
+    monkeypatch.setattr(compare, "load_accounts", lambda *a, **kw: loads.append(a) or load_accounts(*a, **kw))
+    first = client.get("/api/compare?users=alice,bob&k=1").get_json()
+    second = client.get("/api/compare?users=alice,bob&k=1&offset=1").get_json()
+    assert client.get("/compare/alice,bob?k=1").status_code == 200
+    assert len(loads) == 1
+    assert first["comparison"]["activity_rank"] != second["comparison"]["activity_rank"]
+
+    # a re-analysis changes the data file version, so the table is rebuilt
+    storage.save("bob", make_tweet_frame(300, seed=1))
+    body = client.get("/api/compare?users=alice,bob").get_json()
+    assert len(loads) == 2
+    assert body["stats"]["bob"]["tweet_activity"]["total_tweets"] == 300
+
+
+@pytest.mark.parametrize("route", ["/api/compare", "/api/terms", "/api/timeline"])
+@pytest.mark.parametrize("users", ["alice,../bob", "alice,bob/x", "a.b"])
+def test_multi_user_routes_reject_bad_usernames(client, route, users):
+    response = client.get(f"{route}?users={users}")
+    assert response.status_code == 400
+    assert "invalid username" in response.get_json()["error"]
+
+
+def test_metrics_endpoint(client):
+    metrics.reset()
+    metrics.enable()
+    try:
+        with metrics.timed("summary"):
+            pass
+        client.get("/api/user/alice/stats")
+        response = client.get("/metrics")
+    finally:
+        metrics.enable(False)
+        metrics.reset()
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "version=0.0.4" in response.headers["Content-Type"]
+    text = response.get_data(as_text=True)
+    assert 'xstats_stage_duration_seconds_count{stage="summary"} 1' in text
+    assert "# TYPE xstats_summary_cache_misses gauge" in text
+    assert "xstats_rss_mb " in text
+
+
+def test_charts_are_served_from_any_working_directory(storage, tmp_path, monkeypatch, capsys):
+    run_dir = tmp_path / "elsewhere"
+    run_dir.mkdir()
+    monkeypatch.chdir(run_dir)
+    app = web_dashboard.create_app(storage=storage, user_registry=Registry(str(tmp_path / "registry.db")),
+                                   chart_dir="charts", janitor=False)
+    response = app.test_client().get("/static/alice_heatmap.png")
+    assert response.status_code == 200
+    assert response.data.startswith(b"\x89PNG")
+    path = web_dashboard.chart_cache.get("alice", "heatmap")
+    assert path.startswith(str(run_dir / "charts"))
+    assert f"Saved heatmap: {path}" in capsys.readouterr().out
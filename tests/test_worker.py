@@ -0,0 +1,67 @@
+import os
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+import worker
+
+
+@pytest.fixture
+def key_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "worker.key")
+    monkeypatch.setattr(worker, "WORKER_KEY_FILE", path)
+    monkeypatch.delenv("ANALYSIS_WORKER_KEY", raising=False)
+    return path
+
+
+def test_parse_address():
+    assert worker.parse_address("127.0.0.1:6001") == ("127.0.0.1", 6001)
+    assert worker.parse_address("localhost:6001") == ("localhost", 6001)
+    assert worker.parse_address(":6001") == ("127.0.0.1", 6001)
+    assert worker.parse_address("cache/worker.sock") == "cache/worker.sock"
+
+
+def test_remote_tcp_needs_opt_in():
+    with pytest.raises(RuntimeError, match="ALLOW_REMOTE"):
+        worker.parse_address("0.0.0.0:6001")
+    with pytest.raises(RuntimeError):
+        worker.parse_address("worker.internal:6001")
+    assert worker.parse_address("10.0.0.5:6001", allow_remote=True) == ("10.0.0.5", 6001)
+
+
+def test_no_key_refuses(key_file):
+    with pytest.raises(RuntimeError, match="ANALYSIS_WORKER_KEY"):
+        worker.worker_key()
+
+
+def test_generated_key_is_private_and_shared(key_file):
+    key = worker.worker_key(create=True)
+    assert len(key) == 64
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+    assert worker.worker_key() == key
+    assert worker.worker_key(create=True) == key
+
+
+def test_env_key_wins(key_file, monkeypatch):
+    monkeypatch.setenv("ANALYSIS_WORKER_KEY", "secret")
+    assert worker.worker_key() == b"secret"
+    assert not os.path.exists(key_file)
+
+
+def test_unix_socket_is_private(key_file, tmp_path, monkeypatch):
+    address = str(tmp_path / "sock" / "worker.sock")
+    threading.Thread(target=worker.serve, args=(address,), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            break
+        time.sleep(0.05)
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    assert worker.WorkerClient(address).ping()
+    monkeypatch.setenv("ANALYSIS_WORKER_KEY", "wrong")
+    with pytest.raises(AuthenticationError):
+        worker.WorkerClient(address).ping()
+    monkeypatch.delenv("ANALYSIS_WORKER_KEY")
+    assert worker.WorkerClient(address).ping()  # still serving after the bad client
@@ -1,134 +1,230 @@
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, jsonify
 import os
 import pandas as pd
 import json
 from collections import defaultdict
 from datetime import datetime
 import numpy as np
-import time
+import re
+import gzip
+import hashlib
 import os
+from jobs import JobQueue
+from storage import DATA_DIR, get_storage, migrate_csv_files
+from stats import LRUCache, get_summary
+from charts import CHART_DIR, ChartCache
+from compare import COMPARE_CACHE_SIZE, compare_accounts
+from terms import TERM_KINDS, get_terms, merge_indexes
+from rollups import get_rollups, merge_rollups
+from page_cache import get_page_cache
+from memory import get_memory_budget
+from registry import get_registry, start_janitor, JANITOR_INTERVAL
+import metrics
 
-DATA_DIR = "data"
 STATIC_DIR = "static"
 
-# ✅ Ensure these folders exist even if Git didn't track them
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(STATIC_DIR, exist_ok=True)
 
+app = Flask(__name__, static_folder=None)  # static_files below serves /static (and renders charts)
 
-def clean_old_files(directory, age_limit_seconds=3600):  # 1 hour default
-    now = time.time()
-    for fname in os.listdir(directory):
-        fpath = os.path.join(directory, fname)
-        if os.path.isfile(fpath):
-            if now - os.path.getmtime(fpath) > age_limit_seconds:
-                os.remove(fpath)
+# Set up by create_app(), so importing this module touches no files and
+# starts no threads
+job_queue = None
+user_storage = None
+summary_cache = None
+compare_cache = None
+registry = None
+memory_budget = None
+chart_cache = None
 
-app = Flask(__name__)
-DATA_DIR = "data"
-STATIC_DIR = "static"
-os.makedirs(STATIC_DIR, exist_ok=True)  # Create static folder if it doesn't exist
+
+def create_app(storage=None, user_registry=None, chart_dir=CHART_DIR, janitor=JANITOR_INTERVAL > 0):
+    """
+    Open the storage and the registry, convert legacy CSV files, start the
+    job queue and the janitor, and return the app. Serve it with
+    `python web_dashboard.py` or a WSGI server pointed at `create_app()`.
+    """
+    global job_queue, user_storage, summary_cache, compare_cache, registry, memory_budget, chart_cache
+    # ✅ Ensure these folders exist even if Git didn't track them
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(STATIC_DIR, exist_ok=True)
+
+    metrics.enable(os.environ.get("METRICS_ENABLED", "1") != "0")
+    job_queue = JobQueue()
+    user_storage = migrate_csv_files(storage or get_storage())
+    summary_cache = LRUCache()
+    compare_cache = LRUCache(COMPARE_CACHE_SIZE)
+    registry = user_registry or get_registry()
+    registry.sync(user_storage)
+    memory_budget = get_memory_budget()  # baseline RSS taken once the app is loaded
+    chart_cache = ChartCache(user_storage, chart_dir=chart_dir, registry=registry)
+    if janitor:
+        start_janitor(registry, remove_user_data)
+    return app
+
+
+# Accounts per ranking page on /compare, and the most a client may ask for
+COMPARE_PAGE_SIZE = int(os.environ.get("COMPARE_PAGE_SIZE", 25))
+MAX_PAGE_SIZE = 1000
+
+CHART_FILE_RE = re.compile(r"^([A-Za-z0-9_]+)_(heatmap|wordcloud|timeline)\.png$")
+
+USERNAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
 
 # Helper to list all users with data
 def get_all_users():
-    return [f[:-4] for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
+    return registry.list_users()
+
+def remove_user_data(username):
+    """Delete a user's data, summary and charts, and drop them from the registry."""
+    charts = registry.remove_user(username)
+    user_storage.delete(username)
+    summary_cache.invalidate(username)
+    # Registered charts, plus pre-chart-cache files named after the user
+    charts += [os.path.join(STATIC_DIR, f'{username}_{kind}.png') for kind in ('heatmap', 'wordcloud', 'timeline')]
+    for path in charts:
+        if os.path.exists(path):
+            os.remove(path)
+
+# Types that are already JSON-safe, checked by exact type before any isinstance walk
+_JSON_SCALARS = frozenset([str, int, float, bool, type(None)])
 
 def safe_serialize(obj, depth=0):
     """Safely serialize data with depth limit to prevent recursion"""
+    if type(obj) in _JSON_SCALARS:  # fast path for the common case
+        return obj
     if depth > 10:  # Prevent infinite recursion
         return str(obj)
         
-    if isinstance(obj, (pd.DataFrame, pd.Series)):
-        return obj.to_dict()
-    if isinstance(obj, (np.integer, np.int64)):
-        return int(obj)
-    if isinstance(obj, (np.floating, np.float64)):
-        return float(obj)
     if isinstance(obj, dict):
         return {k: safe_serialize(v, depth + 1) for k, v in obj.items()}
     if isinstance(obj, (list, tuple)):
         return [safe_serialize(x, depth + 1) for x in obj]
+    if isinstance(obj, np.generic):  # numpy ints, floats, bools
+        return obj.item()
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return safe_serialize(obj.to_dict(), depth + 1)
+    if isinstance(obj, np.ndarray):
+        return safe_serialize(obj.tolist(), depth + 1)
+    if obj is pd.NaT:
+        return None
     if hasattr(obj, 'isoformat'):  # Handle datetime objects
         return obj.isoformat()
     return obj
 
+def _data_etag(kind, usernames):
+    """Strong ETag from the data file versions behind a response."""
+    versions = [(u, user_storage.version(u)) for u in usernames]
+    digest = hashlib.sha1(json.dumps([kind, versions]).encode()).hexdigest()
+    return digest
+
+def _json_response(etag, build):
+    """
+    JSON response with conditional GET and gzip. `build` is only called when
+    the client doesn't already hold the current version.
+    """
+    compress = request.accept_encodings['gzip'] > 0  # quality, so gzip;q=0 is a refusal
+    if compress:
+        etag += '-gz'  # strong validators differ per content-coding
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        body = json.dumps(safe_serialize(build()), separators=(',', ':')).encode()
+        response = app.response_class(gzip.compress(body, compresslevel=6) if compress else body,
+                                      mimetype='application/json')
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    clean_old_files(DATA_DIR, age_limit_seconds=3600)    # Delete CSVs older than 1 hr
-    clean_old_files(STATIC_DIR, age_limit_seconds=3600)  # Delete images older than 1 hr
     message = ''
     if request.method == 'POST':
         usernames = request.form.get('usernames', '')
+        usernames = [u.strip().lstrip('@') for u in usernames.split(',')]
+        usernames = [u for u in dict.fromkeys(usernames) if USERNAME_RE.match(u)]
         if usernames:
-            usernames = [u.strip().lstrip('@') for u in usernames.split(',')]
-            for username in usernames:
-                os.system(f'python analytics.py "{username}"')
-            if len(usernames) > 1:
-                return redirect(url_for('compare_users', usernames=','.join(usernames)))
-            return redirect(url_for('user_dashboard', username=usernames[0]))
+            job = job_queue.submit(usernames)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'job_id': job.id,
+                                'status_url': url_for('job_status', job_id=job.id)}), 202
+            return redirect(url_for('job_progress', job_id=job.id))
+        message = 'Please enter valid usernames (letters, numbers and underscores).'
     users = get_all_users()
     return render_template('index.html', users=users, message=message)
 
+def _job_result_url(job):
+    if len(job.usernames) > 1:
+        return url_for('compare_users', usernames=','.join(job.usernames))
+    return url_for('user_dashboard', username=job.usernames[0])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    status = job.status()
+    if status['state'] == 'done':
+        status['result_url'] = _job_result_url(job)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/progress')
+def job_progress(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return redirect(url_for('index'))
+    return render_template('job.html', job=job,
+                           status_url=url_for('job_status', job_id=job_id))
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({**summary_cache.stats(), 'compare_cache': compare_cache.stats(),
+                    'page_cache': get_page_cache().stats(),
+                    'memory': memory_budget.status()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    cache = summary_cache.stats()
+    gauges = {
+        'xstats_summary_cache_hits': cache['hits'],
+        'xstats_summary_cache_misses': cache['misses'],
+        'xstats_summary_cache_size': cache['size'],
+    }
+    memory_status = memory_budget.status()
+    gauges.update({
+        'xstats_rss_mb': memory_status['rss_mb'],
+        'xstats_memory_reserved_mb': memory_status['reserved_mb'],
+        'xstats_jobs_waiting_for_memory': memory_status['waiting'],
+    })
+    return app.response_class(metrics.render_prometheus(gauges),
+                              mimetype='text/plain; version=0.0.4')
+
 @app.route('/user/<username>')
 def user_dashboard(username):
-    csv_path = os.path.join(DATA_DIR, f'{username}.csv')
-    if not os.path.exists(csv_path):
+    if not user_storage.exists(username):
         return f"No data for @{username}", 404
-        
-    df = pd.read_csv(csv_path)
-    
-    # Initialize image paths early
-    heatmap = f'{username}_heatmap.png'
-    wordcloud = f'{username}_wordcloud.png'
-    if not os.path.exists(os.path.join(STATIC_DIR, heatmap)):
-        heatmap = None
-    if not os.path.exists(os.path.join(STATIC_DIR, wordcloud)):
-        wordcloud = None
     
     try:
-        # Convert Datetime column to proper datetime
-        df['Datetime'] = pd.to_datetime(df['Datetime'], errors='coerce')
-        
-        # Create a simplified stats structure that won't cause circular references
-        basic_stats = {
-            'tweet_activity': {
-                'total_tweets': len(df),
-                'date_range': f"{df['Datetime'].min().strftime('%Y-%m-%d')} to {df['Datetime'].max().strftime('%Y-%m-%d')}" if not df['Datetime'].isna().all() else 'N/A'
-            },
-            'engagement': {
-                'total': int(df['Engagement'].sum()),
-                'average': round(float(df['Engagement'].mean()), 2),
-                'peak': int(df['Engagement'].max())
-            },
-            'content_analysis': {
-                'hashtags_percentage': round(float(df['HasHashtags'].mean() * 100), 1),
-                'mentions_percentage': round(float(df['HasMentions'].mean() * 100), 1),
-                'links_percentage': round(float(df['HasLinks'].mean() * 100), 1),
-                'media_percentage': round(float(df['HasMedia'].mean() * 100), 1),
-                'avg_word_count': round(float(df['WordCount'].mean()), 1)
-            }
-        }
-        
-        # Add posting patterns
-        day_stats = df.groupby('DayOfWeek')['Engagement'].agg(['mean', 'count']).round(2)
-        hour_stats = df.groupby('Hour')['Engagement'].agg(['mean', 'count']).round(2)
+        # Precomputed at ingest and cached per data file version
+        summary = get_summary(user_storage, username, summary_cache)
+        if summary is None:
+            return f"No data for @{username}", 404
         
-        # Find best times
-        best_day = day_stats['mean'].idxmax() if not day_stats.empty else 'N/A'
-        best_hour = hour_stats['mean'].idxmax() if not hour_stats.empty else 0
-        
-        basic_stats['posting_patterns'] = {
-            'optimal_time': f"{best_day} at {int(best_hour):02d}:00" if best_day != 'N/A' else 'N/A',
-            'days': day_stats.to_dict('index'),
-            'hours': {f"{int(h):02d}:00": stats for h, stats in hour_stats.to_dict('index').items()}
-        }
+        # Charts are rendered lazily by static_files when the page requests them
+        total_tweets = summary['tweet_activity']['total_tweets']
+        heatmap = f'{username}_heatmap.png' if total_tweets >= 2 and summary['engagement']['total'] else None
+        wordcloud = f'{username}_wordcloud.png' if total_tweets else None
+        timeline = f'{username}_timeline.png' if total_tweets >= 2 else None
         
         return render_template('user_dashboard.html',
                              username=username,
-                             stats=basic_stats,
-                             recent_tweets = df[['Datetime', 'Tweet', 'Engagement']].head(10).to_dict('records'),
+                             stats=summary,
+                             recent_tweets=summary['recent_tweets'],
                              heatmap=heatmap,
-                             wordcloud=wordcloud)
+                             wordcloud=wordcloud,
+                             timeline=timeline)
                              
     except Exception as e:
         print(f"Error calculating stats: {e}")
@@ -137,7 +233,7 @@ def user_dashboard(username):
         
         # Return minimal stats structure
         fallback_stats = {
-            'tweet_activity': {'total_tweets': len(df), 'date_range': 'N/A'},
+            'tweet_activity': {'total_tweets': 0, 'date_range': 'N/A'},
             'engagement': {'total': 0, 'average': 0.0, 'peak': 0},
             'content_analysis': {'hashtags_percentage': 0, 'mentions_percentage': 0,
                                'links_percentage': 0, 'media_percentage': 0, 'avg_word_count': 0},
@@ -149,102 +245,148 @@ def user_dashboard(username):
                              stats=fallback_stats,
                              recent_tweets=[],
                              heatmap=None,
-                             wordcloud=None)
+                             wordcloud=None,
+                             timeline=None)
+
+def build_comparison(usernames, k=None, offset=0):
+    return compare_accounts(user_storage, usernames, k=k, offset=offset, cache=compare_cache)
+
+def _page_args(default_k=None):
+    """k/offset pagination from the query string, clamped to 1..MAX_PAGE_SIZE and >= 0."""
+    k = request.args.get('k', type=int) or default_k
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return (max(1, min(k, MAX_PAGE_SIZE)) if k else None), offset
 
 @app.route('/compare/<usernames>')
 def compare_users(usernames):
-    usernames = usernames.split(',')
-    all_stats = {}
-
-    for username in usernames:
-        csv_path = os.path.join(DATA_DIR, f'{username}.csv')
-        if not os.path.exists(csv_path):
-            continue
-
-        df = pd.read_csv(csv_path)
-        df['Datetime'] = pd.to_datetime(df['Datetime'], errors='coerce')
-
-        # 1) Tweet activity + date range safely
-        dt_min = df['Datetime'].min()
-        dt_max = df['Datetime'].max()
-        if pd.isna(dt_min) or pd.isna(dt_max):
-            date_range = 'N/A'
-        else:
-            date_range = f"{dt_min.strftime('%Y-%m-%d')} to {dt_max.strftime('%Y-%m-%d')}"
-
-        # 2) Engagement & content
-        engagement_total   = int(df['Engagement'].sum())
-        engagement_avg     = round(float(df['Engagement'].mean()), 2) if len(df) else 0.0
-        engagement_peak    = int(df['Engagement'].max()) if len(df) else 0
-        hashtags_pct       = round(float(df['HasHashtags'].mean() * 100), 1) if len(df) else 0.0
-        mentions_pct       = round(float(df['HasMentions'].mean() * 100), 1) if len(df) else 0.0
-        media_pct          = round(float(df['HasMedia'].mean() * 100), 1) if len(df) else 0.0
-
-        # 3) Posting patterns: guard empty groupbys
-        day_means  = df.groupby('DayOfWeek')['Engagement'].mean()
-        hour_means = df.groupby('Hour')['Engagement'].mean()
-        best_day   = day_means.idxmax() if not day_means.empty else 'N/A'
-        best_hour  = int(hour_means.idxmax()) if not hour_means.empty else 0
-
-        all_stats[username] = {
-            'tweet_activity': {
-                'total_tweets': len(df),
-                'date_range': date_range,
-            },
-            'engagement': {
-                'total': engagement_total,
-                'average': engagement_avg,
-                'peak': engagement_peak,
-            },
-            'content_analysis': {
-                'hashtags_percentage': hashtags_pct,
-                'mentions_percentage': mentions_pct,
-                'media_percentage': media_pct,
-            },
-            'posting_patterns': {
-                'best_day': best_day,
-                'best_hour': best_hour,
-            }
+    k, offset = _page_args(COMPARE_PAGE_SIZE)
+    all_stats, comparison, total = build_comparison(usernames.split(','), k, offset)
+    return render_template('comparison.html',
+                           stats=all_stats,
+                           comparison=comparison,
+                           total=total, k=k, offset=offset,
+                           usernames=usernames)
+
+def _users_arg():
+    """
+    Usernames from the comma-separated ?users= value, or a 400 response if
+    one isn't a valid username (they end up in storage paths).
+    """
+    usernames = [u for u in request.args.get('users', '').split(',') if u]
+    bad = [u for u in usernames if not USERNAME_RE.match(u)]
+    if bad:
+        return None, (jsonify({'error': f'invalid username: {bad[0]!r}'}), 400)
+    return usernames, None
+
+def _public_summary(summary):
+    return {k: v for k, v in summary.items() if k != 'source'}
+
+@app.route('/api/user/<username>/stats')
+def api_user_stats(username):
+    if not user_storage.exists(username):
+        return jsonify({'error': f'No data for @{username}'}), 404
+
+    def build():
+        summary = get_summary(user_storage, username, summary_cache)
+        return {'username': username, 'stats': _public_summary(summary)}
+
+    return _json_response(_data_etag('user', [username]), build)
+
+@app.route('/api/compare')
+def api_compare():
+    usernames, error = _users_arg()
+    if error:
+        return error
+    if not usernames:
+        return jsonify({'error': 'pass ?users=name1,name2'}), 400
+
+    k, offset = _page_args()
+
+    def build():
+        all_stats, comparison, total = build_comparison(usernames, k, offset)
+        return {
+            'total': total,
+            'offset': offset,
+            'stats': all_stats,
+            'comparison': {rank: [[u, s] for u, s in ranked]
+                           for rank, ranked in comparison.items()},
         }
 
-    comparison = {
-        'engagement_rank': sorted(
-            all_stats.items(),
-            key=lambda x: x[1]['engagement']['average'],
-            reverse=True
-        ),
-        'activity_rank': sorted(
-            all_stats.items(),
-            key=lambda x: x[1]['tweet_activity']['total_tweets'],
-            reverse=True
-        ),
-        'media_rank': sorted(
-            all_stats.items(),
-            key=lambda x: x[1]['content_analysis']['media_percentage'],
-            reverse=True
-        ),
-    }
+    return _json_response(_data_etag(f'compare:{k}:{offset}', usernames), build)
+
+@app.route('/api/terms')
+def api_terms():
+    """Top terms across one or more users, merged from their term indexes."""
+    usernames, error = _users_arg()
+    if error:
+        return error
+    usernames = [u for u in usernames if user_storage.exists(u)]
+    if not usernames:
+        return jsonify({'error': 'pass ?users=name1,name2 with analyzed users'}), 400
+    n = max(1, min(request.args.get('n', 20, type=int), MAX_PAGE_SIZE))
+
+    def build():
+        merged = merge_indexes(get_terms(user_storage, u) for u in usernames)
+        return {'users': usernames, 'tweets': merged.tweets,
+                'top': {kind: merged.top(kind, n) for kind in TERM_KINDS}}
+
+    return _json_response(_data_etag(f'terms:{n}', usernames), build)
+
+@app.route('/api/timeline')
+def api_timeline():
+    """Engagement per period for one or more users, summed from their rollups."""
+    usernames, error = _users_arg()
+    if error:
+        return error
+    usernames = [u for u in usernames if user_storage.exists(u)]
+    if not usernames:
+        return jsonify({'error': 'pass ?users=name1,name2 with analyzed users'}), 400
+    freq = {'day': 'D', 'week': 'W', 'month': 'MS'}.get(request.args.get('period', 'week'))
+    if freq is None:
+        return jsonify({'error': 'period must be day, week or month'}), 400
+    dates = {}
+    for arg in ('start', 'end'):
+        value = request.args.get(arg)
+        if value:
+            date = pd.to_datetime(value, errors='coerce')
+            if pd.isna(date):
+                return jsonify({'error': f'{arg} must be a date, e.g. 2024-01-31'}), 400
+            value = date.strftime('%Y-%m-%d')
+        dates[arg] = value
+    start, end = dates['start'], dates['end']
+
+    def build():
+        rollups = merge_rollups(get_rollups(user_storage, u) for u in usernames).window(start, end)
+        series = rollups.series(freq)
+        best_day, best_hour = rollups.best_time()
+        return {'users': usernames, 'best_day': best_day, 'best_hour': best_hour,
+                'periods': [{'start': ts.strftime('%Y-%m-%d'), 'tweets': int(row['count']),
+                             'engagement': int(row['Engagement']), 'mean': round(float(row['mean']), 2)}
+                            for ts, row in series.iterrows()]}
+
+    kind = f"timeline:{freq}:{start}:{end}"
+    return _json_response(_data_etag(kind, usernames), build)
 
-    return render_template('comparison.html',
-                           stats=all_stats,
-                           comparison=comparison)
 @app.route('/static/<path:filename>')
 def static_files(filename):
+    match = CHART_FILE_RE.match(filename)
+    if match:
+        path = chart_cache.get(*match.groups())
+        if path is None:
+            return "Chart not available", 404
+        return send_from_directory(chart_cache.chart_dir, os.path.basename(path),
+                                   mimetype='image/png', max_age=0)
     if filename.endswith('.css'):
         return send_from_directory('static', filename, mimetype='text/css')
     return send_from_directory(STATIC_DIR, filename)
 
 @app.route('/delete/<username>', methods=['POST'])
 def delete_user(username):
-    # Delete CSV and images
-    for ext in ['.csv', '_heatmap.png', '_wordcloud.png']:
-        path = os.path.join(DATA_DIR, f'{username}{ext}')
-        if os.path.exists(path):
-            os.remove(path)
+    remove_user_data(username)
     return redirect(url_for('index'))
 
 import os
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
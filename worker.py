@@ -0,0 +1,167 @@
+"""
+Long-lived analysis worker.
+
+Keeps pandas, the HTTP session and the Chrome driver pool warm so each
+analysis skips interpreter start-up and heavy imports. The web app talks
+to it over a local socket when ANALYSIS_WORKER_ADDRESS is set.
+
+Requests are pickled, so anyone who can connect and knows the key can run
+code in the worker. It listens on a Unix socket only its own user can
+open, authenticates with ANALYSIS_WORKER_KEY (or a random key written to
+ANALYSIS_WORKER_KEY_FILE for clients on the same host), and refuses TCP
+addresses other than loopback unless ANALYSIS_WORKER_ALLOW_REMOTE=1.
+
+Usage:
+    python worker.py              # listens on ANALYSIS_WORKER_ADDRESS
+"""
+import os
+import secrets
+import ipaddress
+import threading
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+DEFAULT_ADDRESS = os.path.join("cache", "worker.sock")
+WORKER_KEY_FILE = os.environ.get("ANALYSIS_WORKER_KEY_FILE", os.path.join("cache", "worker.key"))
+ALLOW_REMOTE = os.environ.get("ANALYSIS_WORKER_ALLOW_REMOTE", "0") == "1"
+
+
+def parse_address(address, allow_remote=None):
+    """
+    "host:port" for TCP, anything else is a Unix socket path. TCP hosts
+    other than loopback raise RuntimeError unless `allow_remote`
+    (ANALYSIS_WORKER_ALLOW_REMOTE) is set.
+    """
+    host, sep, port = address.rpartition(":")
+    if not (sep and port.isdigit()):
+        return address
+    host = host or "127.0.0.1"
+    allow_remote = ALLOW_REMOTE if allow_remote is None else allow_remote
+    if not allow_remote and not _is_loopback(host):
+        raise RuntimeError(f"Refusing worker address {address}: not a loopback address. "
+                           "Set ANALYSIS_WORKER_ALLOW_REMOTE=1 to use it anyway")
+    return host, int(port)
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+def worker_key(create=False):
+    """
+    ANALYSIS_WORKER_KEY, or the key in WORKER_KEY_FILE. With `create` (the
+    worker) a random key is written there, readable by this user only, if
+    there is none yet. Raises RuntimeError when no key is available.
+    """
+    key = os.environ.get("ANALYSIS_WORKER_KEY")
+    if key:
+        return key.encode()
+    try:
+        with open(WORKER_KEY_FILE, "rb") as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = None
+    if key:
+        return key
+    if not create:
+        raise RuntimeError("No analysis worker key: set ANALYSIS_WORKER_KEY or start worker.py first "
+                           f"so it writes {WORKER_KEY_FILE}")
+    os.makedirs(os.path.dirname(WORKER_KEY_FILE) or ".", exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    fd = os.open(WORKER_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    print(f"Wrote a new analysis worker key to {WORKER_KEY_FILE}")
+    return key
+
+
+def _handle(conn):
+    import analytics
+    import memory
+
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+            op = request.get("op")
+            try:
+                if op == "ping":
+                    reply = {"ok": True}
+                elif op == "analyze":
+                    with memory.job(f"@{request['username']}") as usage:
+                        tweets = analytics.analyze_user(request["username"], request.get("max_tweets", 20))
+                    if not tweets:
+                        reply = {"ok": False, "error": f"No data found for @{request['username']}"}
+                    else:
+                        reply = {"ok": True, "tweets": tweets, "peak_rss_mb": round(usage.peak_mb, 1)}
+                else:
+                    reply = {"ok": False, "error": f"unknown op {op!r}"}
+            except Exception as e:
+                traceback.print_exc()
+                reply = {"ok": False, "error": repr(e)}
+            conn.send(reply)
+
+
+def _listen(address, authkey):
+    if isinstance(address, tuple):
+        return Listener(address, authkey=authkey)
+    os.makedirs(os.path.dirname(address) or ".", exist_ok=True)
+    if os.path.exists(address):
+        os.remove(address)  # left behind by a worker that didn't shut down cleanly
+    # Create the socket as 0600 rather than chmod it after it is already reachable
+    umask = os.umask(0o177)
+    try:
+        return Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(umask)
+
+
+def serve(address=None):
+    address = parse_address(address or os.environ.get("ANALYSIS_WORKER_ADDRESS") or DEFAULT_ADDRESS)
+    authkey = worker_key(create=True)
+    import analytics  # noqa: F401  (pay the import cost once, up front)
+
+    with _listen(address, authkey) as listener:
+        print(f"Analysis worker listening on {listener.address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError) as e:
+                print(f"Rejected worker connection: {e!r}")
+                continue
+            threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+
+
+class WorkerClient:
+    def __init__(self, address=None):
+        self.address = parse_address(address or os.environ.get("ANALYSIS_WORKER_ADDRESS") or DEFAULT_ADDRESS)
+
+    def _call(self, request):
+        with Client(self.address, authkey=worker_key()) as conn:
+            conn.send(request)
+            return conn.recv()
+
+    def ping(self):
+        return self._call({"op": "ping"})["ok"]
+
+    def analyze(self, username, max_tweets=20):
+        """
+        Run an analysis in the worker. Returns the tweet count and the
+        worker's peak RSS while it ran; raises ValueError on failure.
+        """
+        reply = self._call({"op": "analyze", "username": username, "max_tweets": max_tweets})
+        if not reply["ok"]:
+            raise ValueError(reply["error"])
+        return {"tweets": reply["tweets"], "peak_rss_mb": reply.get("peak_rss_mb")}
+
+
+if __name__ == "__main__":
+    serve()